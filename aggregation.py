@@ -0,0 +1,221 @@
+"""
+aggregation
+
+This module ranks the words and emojis of a chat across all
+its authors at once.
+
+FrequencyMatrix maps each term (word or emoji) to an integer id and
+keeps the counts of every author in a sparse matrix, stored as three
+numpy arrays in compressed rows (one row per author). From it, the
+chat-wide totals, the top-N terms of each author (with a partial
+selection instead of a full sort) and the terms that are distinctive
+of each author are computed with vectorized operations.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (typing),
+downloaded packages (numpy, installed with wordcloud).
+"""
+
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+
+KINDS = ("words", "emojis")
+
+class FrequencyMatrix:
+    """
+    A sparse authors x terms matrix of counts.
+
+    The row of an author holds its terms in the order in which
+    they were first counted, and ties in the rankings are broken
+    by that order, so `get_most_common(n, author)` returns the same
+    list as `FreqDist.most_common(n)`. Term ids are assigned in the
+    order in which terms appear, author after author.
+
+    Parameters:
+        - authors: the names of the authors, one per row
+        - frequencies: the counts of each author (a FreqDist or any
+        mapping from term to count), in the same order
+
+    Example:
+        ```python
+        matrix = FrequencyMatrix.from_authors(summary.authors, "words")
+        matrix.get_most_common(10)             # chat-wide ranking
+        matrix.get_most_common(10, "Ana")      # ranking of one author
+        matrix.get_distinctive_terms(5)        # {author: [(word, score), ...]}
+        ```
+    """
+
+    def __init__(self, authors: Iterable[str], frequencies: Iterable[Mapping[str, int]]) -> None:
+        self.__authors = list(authors)
+        self.__rows = {name: row for row, name in enumerate(self.__authors)}
+        self.__ids = dict[str, int]()
+        indices = list[int]()
+        counts = list[int]()
+        indptr = [0]
+        ids = self.__ids
+        for frequency in frequencies:
+            # FreqDist iterates its keys by frequency, so items() is used for
+            # the order of insertion. len(ids) is evaluated before setdefault,
+            # so new terms get the next id.
+            items = frequency.items()
+            indices.extend([ids.setdefault(term, len(ids)) for term, _ in items])
+            counts.extend([count for _, count in items])
+            indptr.append(len(indices))
+        if len(indptr) - 1 != len(self.__authors):
+            raise ValueError("There must be one frequency distribution per author.")
+        self.__terms = list(ids)
+        self.__indptr = np.array(indptr, dtype=np.int64)
+        self.__indices = np.array(indices, dtype=np.int64)
+        self.__counts = np.array(counts, dtype=np.int64)
+        self.__totals = None
+
+    @classmethod
+    def from_authors(cls, authors: Iterable, kind: str = "words") -> "FrequencyMatrix":
+        """
+        Builds the matrix of the words or of the emojis of some
+        authors (Author or AuthorSummary objects).
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind}, use one of {KINDS}.")
+        authors = list(authors)
+        if kind == "words":
+            frequencies = [author.get_word_frequency() for author in authors]
+        else:
+            frequencies = [author.get_emoji_frequency() for author in authors]
+        return cls([author.name for author in authors], frequencies)
+
+    @property
+    def authors(self) -> list[str]:
+        "Returns the names of the authors, in row order."
+        return list(self.__authors)
+
+    @property
+    def terms(self) -> list[str]:
+        "Returns the terms, indexed by their id."
+        return list(self.__terms)
+
+    @property
+    def totals(self) -> np.ndarray:
+        "Returns the chat-wide count of each term, indexed by its id."
+        if self.__totals is None:
+            self.__totals = np.bincount(
+                self.__indices, weights=self.__counts, minlength=len(self.__terms)
+            ).astype(np.int64)
+        return self.__totals
+
+    def count_terms(self, author_name: Optional[str] = None) -> int:
+        "Returns the number of distinct terms of an author, or of the chat."
+        if author_name is None:
+            return len(self.__terms)
+        start, end = self.__get_bounds(author_name)
+        return end - start
+
+    def count_total(self, author_name: Optional[str] = None) -> int:
+        "Returns the number of terms counted for an author, or for the chat."
+        if author_name is None:
+            return int(self.__counts.sum())
+        start, end = self.__get_bounds(author_name)
+        return int(self.__counts[start:end].sum())
+
+    def get_entries(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the nonzero entries of the matrix as three arrays:
+        the row of the author, the id of the term and the count.
+        """
+        return self.__get_rows(), self.__indices.copy(), self.__counts.copy()
+
+    def get_author_totals(self) -> np.ndarray:
+        "Returns the number of terms counted for each author, in row order."
+        return np.bincount(
+            self.__get_rows(), weights=self.__counts, minlength=len(self.__authors)
+        ).astype(np.int64)
+
+    def get_most_common(self, n: int, author_name: Optional[str] = None) -> list[tuple[str, int]]:
+        """
+        Returns the n most common terms of an author, or of the
+        whole chat if no author is given, with their counts.
+        """
+        if author_name is None:
+            counts = self.totals
+            ids = None
+        else:
+            start, end = self.__get_bounds(author_name)
+            counts = self.__counts[start:end]
+            ids = self.__indices[start:end]
+        positions = select_largest(counts, n)
+        if ids is not None:
+            return [(self.__terms[ids[i]], int(counts[i])) for i in positions]
+        return [(self.__terms[i], int(counts[i])) for i in positions]
+
+    def get_distinctive_terms(self, n: int, prior: float = 1.0) -> dict[str, list[tuple[str, float]]]:
+        """
+        Returns, for each author, up to n terms used more by that
+        author than by the rest of the chat, the most distinctive first.
+
+        Terms are scored by the z-score of the log-odds ratio between
+        the author and the other authors, smoothed with `prior`
+        (Monroe, Colaresi and Quinn, 2008). The score grows with both
+        the difference in usage and the amount of evidence, so a
+        word used once is never more distinctive than a word used
+        often and only by that author. Every author is scored in a
+        single pass over the nonzero entries of the matrix.
+        """
+        result = {name: list[tuple[str, float]]() for name in self.__authors}
+        if n <= 0 or not len(self.__counts):
+            return result
+        rows = self.__get_rows()
+        author_counts = self.__counts.astype(np.float64)
+        author_totals = self.get_author_totals().astype(np.float64)[rows]
+        rest_counts = self.totals[self.__indices] - author_counts
+        rest_totals = float(self.__counts.sum()) - author_totals
+        # The prior of an extra, unseen term keeps the odds finite
+        # when a single term was counted.
+        prior_total = prior * (len(self.__terms) + 1)
+
+        author_odds = (author_counts + prior) / (author_totals + prior_total - author_counts - prior)
+        rest_odds = (rest_counts + prior) / (rest_totals + prior_total - rest_counts - prior)
+        variance = 1.0 / (author_counts + prior) + 1.0 / (rest_counts + prior)
+        scores = (np.log(author_odds) - np.log(rest_odds)) / np.sqrt(variance)
+
+        # Sort by row and, within each row, by score (stable, so ties keep row order).
+        order = np.lexsort((-scores, rows))
+        for row, name in enumerate(self.__authors):
+            start, end = self.__indptr[row], min(self.__indptr[row] + n, self.__indptr[row + 1])
+            result[name] = [
+                (self.__terms[self.__indices[i]], float(scores[i]))
+                for i in order[start:end] if scores[i] > 0
+            ]
+        return result
+
+    def __get_rows(self) -> np.ndarray:
+        "Returns the row of each nonzero entry."
+        return np.repeat(np.arange(len(self.__authors)), np.diff(self.__indptr))
+
+    def __get_bounds(self, author_name: str) -> tuple[int, int]:
+        row = self.__rows.get(author_name)
+        if row is None:
+            raise KeyError(f"Unknown author {author_name}.")
+        return int(self.__indptr[row]), int(self.__indptr[row + 1])
+
+    def __repr__(self) -> str:
+        return (f"<FrequencyMatrix with {len(self.__authors)} authors, "
+                f"{len(self.__terms)} terms and {len(self.__counts)} entries>")
+
+def select_largest(counts: np.ndarray, n: int) -> np.ndarray:
+    """
+    Returns the positions of the n largest counts, sorted by count
+    and then by position, like Counter.most_common. The candidates
+    are found with a partial selection (np.partition), and only
+    they are sorted.
+    """
+    if n <= 0 or not len(counts):
+        return np.zeros(0, dtype=np.int64)
+    if n < len(counts):
+        threshold = np.partition(counts, len(counts) - n)[len(counts) - n]
+        candidates = np.flatnonzero(counts >= threshold)
+    else:
+        candidates = np.arange(len(counts))
+    ranking = np.argsort(-counts[candidates], kind="stable")
+    return candidates[ranking[:n]]
@@ -9,23 +9,118 @@ such as date, time, author, message text, and emojis.
 It processes a text file containing a WhatsApp chat and 
 stores the messages in a Chat object, 
 which can be retrieved with the get_chat() method.
+The messages can also be streamed one by one with
+iter_messages(), without building a Chat object.
+Besides plain text files, it reads the chat of a `.zip` export, a
+gzipped file and the standard input ("-"), decompressing them as the
+lines are parsed (see open_chat).
 
 WhatsappAnalyzer uses LexicalAnalyzer to analyze a WhatsApp chat.
 The results are then displayed using a WhatsappResult object.
 
-Dependencies: standard python modules (datetime, os, re),
-downloaded packages (nltk), own module (models, results).
+Dependencies: standard python modules (concurrent, contextlib, datetime, gzip, io,
+itertools, mmap, os, re, sys, zipfile),
+downloaded packages (nltk), own module (cache, formats, images, models, profiling,
+results, sentiment, stopwords).
 
 Author: Christopher Villamarín (xeland314)
 """
 
-from datetime import datetime
-from os.path import exists
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+import gzip
+from io import BytesIO, TextIOWrapper
+from itertools import chain, repeat
+from mmap import mmap, ACCESS_READ
+from os.path import basename, exists, getsize, join
 import re
-from typing import Optional
+import sys
+from typing import AnyStr, BinaryIO, Iterable, Iterator, Optional, TextIO, Union
+from zipfile import ZipFile
 
-from models import Chat, Message
-from results import ConsoleBuilder
+from cache import AnalysisCache, IncrementalState
+from formats import ANDROID, ChatFormat, detect_file_format, detect_stream_format
+from images import IMAGE_CACHE_DIRECTORY
+from profiling import NULL_PROFILER, NullProfiler, Profiler
+from models import Chat, ChatSummary, Message, set_tokenizer
+from results import get_builder
+
+BOM = b"\xef\xbb\xbf"
+BACKENDS = ("text", "mmap")
+STDIN = "-"
+COMPRESSED_SUFFIXES = (".gz", ".zip")
+# The name of the chat in the .zip exports of iOS. Android names it
+# "WhatsApp Chat with <name>.txt".
+ZIP_CHAT_NAME = "_chat.txt"
+# Returned by the filter when the rest of the file can be skipped.
+STOP = object()
+# Timestamps cached by each analyzer. Exports are chronological, so the
+# cache only needs the recent ones and is cleared when it is full.
+DATETIME_CACHE_SIZE = 4096
+
+class MessageFilter:
+    """
+    MessageFilter selects the messages to analyze by date and author.
+    An empty filter (the default) selects every message.
+
+    Parameters:
+        - since: datetime, the first moment included (optional)
+        - until: datetime, the first moment excluded (optional)
+        - authors: the names of the authors included (optional)
+    """
+
+    def __init__(
+        self, since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        authors: Optional[Iterable[str]] = None
+    ) -> None:
+        self.__since = since
+        self.__until = until
+        self.__authors = frozenset(authors) if authors else None
+        # Messages may be slightly out of order around `until` (they are
+        # sorted by arrival), so reading stops one day after it.
+        self.__stop = datetime.combine(until.date() + timedelta(days=1), time()) \
+            if until is not None else None
+
+    @property
+    def since(self) -> Optional[datetime]:
+        "Returns the first moment included, or None."
+        return self.__since
+
+    @property
+    def until(self) -> Optional[datetime]:
+        "Returns the first moment excluded, or None."
+        return self.__until
+
+    @property
+    def stop(self) -> Optional[datetime]:
+        "Returns the moment from which no more messages are read, or None."
+        return self.__stop
+
+    @property
+    def authors(self) -> Optional[frozenset[str]]:
+        "Returns the names of the authors included, or None for all of them."
+        return self.__authors
+
+    def get_key(self) -> str:
+        """
+        Returns a text that identifies the selection, used to
+        keep the cached analyses of each selection apart.
+        It is empty for an empty filter.
+        """
+        if not self:
+            return ""
+        since = self.__since.isoformat() if self.__since else ""
+        until = self.__until.isoformat() if self.__until else ""
+        authors = "\n".join(sorted(self.__authors or ()))
+        return f"{since}|{until}|{authors}"
+
+    def __bool__(self) -> bool:
+        return self.__since is not None or self.__until is not None or self.__authors is not None
+
+    def __repr__(self) -> str:
+        return f"<MessageFilter since={self.__since} until={self.__until} authors={self.__authors}>"
 
 class WhatsappLexicalAnalyzer:
 
@@ -33,7 +128,18 @@ class WhatsappLexicalAnalyzer:
     LexicalAnalyzer recognizes message patterns in one chat.
 
     Parameters:
-        - filename: str
+        - backend: str, how files are read. "text" (default) reads
+        them line by line; "mmap" maps them in memory and finds the
+        message headers with a bytes regex over the whole buffer.
+        - message_filter: MessageFilter, the messages to keep. The
+        others are skipped when their header is read, before their
+        timestamp is converted (for the authors filter) and before
+        their Message is created. Exports are chronological, so
+        reading stops at the first message of the day after `until`.
+        - chat_format: ChatFormat, the layout of the headers (see
+        formats). By default, it is detected from the first lines of
+        each file, and only the parser of that layout is used.
+        Lines before the first header are ignored.
 
     Returns:
         - chat: Chat
@@ -46,8 +152,24 @@ class WhatsappLexicalAnalyzer:
     message_pattern = \
         re.compile(r'(\d{1,2}/\d{1,2}/\d{2})(,)? (\d{1,2}:\d{2}) - (.+?)(\s)?:(\s)?(?P<message>.+?)(\n|$)')
 
-    def __init__(self) -> None:
+    def __init__(
+        self, backend: str = "text", message_filter: Optional[MessageFilter] = None,
+        chat_format: Optional[ChatFormat] = None
+    ) -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, use one of {BACKENDS}.")
+        self.__backend = backend
+        self.__filter = message_filter or MessageFilter()
+        self.__chat_format = chat_format
+        self.__format = chat_format or ANDROID
         self.__chat = Chat()
+        self.__datetimes = dict[tuple[str, str], datetime]()
+        self.__bytes_datetimes = dict[tuple[bytes, bytes], datetime]()
+
+    @property
+    def chat_format(self) -> ChatFormat:
+        "Returns the format of the headers given, or detected in the last file parsed."
+        return self.__format
 
     def extract_author(self, text) -> str:
         """
@@ -66,10 +188,7 @@ class WhatsappLexicalAnalyzer:
         """
         match = self.date_pattern.search(text)
         if match:
-            date_str = match.group("date")
-            time_str = match.group("time")
-            datetime_str = f'{date_str} {time_str}'
-            return datetime.strptime(datetime_str, "%d/%m/%y %H:%M")
+            return self.to_datetime(match.group("date"), match.group("time"))
         return None
 
     def extract_message(self, text) -> str:
@@ -82,6 +201,223 @@ class WhatsappLexicalAnalyzer:
             return match.group("message")
         return ""
 
+    def to_datetime(self, date_str: str, time_str: str) -> datetime:
+        """
+        Converts the date and time strings of a message header
+        into a datetime object, with the converter of the current
+        format. Results are cached by the pair of strings, since
+        a chat repeats the same timestamps many times. The cache
+        keeps at most DATETIME_CACHE_SIZE of them.
+        """
+        key = (date_str, time_str)
+        date_time = self.__datetimes.get(key)
+        if date_time is None:
+            date_time = self.__format.to_datetime(date_str, time_str)
+            if len(self.__datetimes) >= DATETIME_CACHE_SIZE:
+                self.__datetimes.clear()
+            self.__datetimes[key] = date_time
+        return date_time
+
+    def __use_format(self, chat_format: ChatFormat) -> None:
+        "Sets the format of the file being parsed, and forgets the timestamps of another one."
+        if chat_format != self.__format:
+            self.__format = chat_format
+            self.__datetimes.clear()
+            self.__bytes_datetimes.clear()
+
+    def parse_lines(
+        self, lines: Iterable[str], chat_format: Optional[ChatFormat] = None
+    ) -> Iterator[tuple[datetime, str, str]]:
+        """
+        Parses the lines of a chat and yields one
+        (date_time, author, text) record per message.
+
+        Notes:
+            - Without a chat_format (given here or to the analyzer),
+            the format is detected from the first lines (see
+            formats.detect_stream_format), which are then parsed as usual.
+            - Each line is matched once against the `line_pattern` of
+            the format, which extracts the date, time, author and
+            message together.
+            - Lines that do not start with a date/time are
+            considered a continuation of the previous message.
+            - Lines with a date/time but without an author (system
+            notifications) are ignored.
+            - The lines of a message are collected in a list and
+            joined once when the message is complete.
+            - Messages rejected by the filter are skipped with their
+            continuation lines (their parts are set to None).
+        """
+        chat_format = chat_format or self.__chat_format
+        if chat_format is None:
+            chat_format, lines = detect_stream_format(lines)
+        self.__use_format(chat_format)
+        match_line = chat_format.line_pattern.match
+        current_author = ""
+        current_date_time = None
+        # Lines before the first header do not belong to any message.
+        current_parts = None
+        for line in lines:
+            match = match_line(line)
+            if match is None:
+                if current_parts is not None:
+                    current_parts.append(line)
+                continue
+            author = match.group("author")
+            if author is None:
+                continue
+            if current_parts:
+                text = "".join(current_parts)
+                if text:
+                    yield current_date_time, current_author, text
+            current_parts = None
+            date_time = self.__select(author, match.group("date"), match.group("time"))
+            if date_time is None:
+                continue
+            if date_time is STOP:
+                break
+            current_author = author
+            current_date_time = date_time
+            current_parts = [match.group("message") or ""]
+        if current_parts:
+            text = "".join(current_parts)
+            if text:
+                yield current_date_time, current_author, text
+
+    def __select(self, author: str, date_str: AnyStr, time_str: AnyStr) -> Union[datetime, None, object]:
+        """
+        Applies the filter to a message header, whose date and time
+        may be str or bytes. Returns its datetime if the message is
+        selected, None if it is skipped, or STOP if no later message
+        can be selected.
+        """
+        convert = self.__bytes_to_datetime if isinstance(date_str, bytes) else self.to_datetime
+        message_filter = self.__filter
+        if not message_filter:
+            return convert(date_str, time_str)
+        authors, until = message_filter.authors, message_filter.until
+        if until is None and authors is not None and author not in authors:
+            return None
+        date_time = convert(date_str, time_str)
+        if until is not None and date_time >= until:
+            return STOP if date_time >= message_filter.stop else None
+        if authors is not None and author not in authors:
+            return None
+        if message_filter.since is not None and date_time < message_filter.since:
+            return None
+        return date_time
+
+    def iter_messages(self, filename) -> Iterator[tuple[datetime, str, str]]:
+        """
+        Reads a text file and yields one (date_time, author, text)
+        record per message, without storing them in a Chat object.
+        Use it to process chats that do not fit in memory.
+
+        Args:
+            filename (str): The name of the file to process, a .zip
+            or .gz file, or "-" for the standard input. These are
+            read as text streams, even with the "mmap" backend.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+
+        Example:
+            ```python
+            analyzer = WhatsappLexicalAnalyzer()
+            for date_time, author, text in analyzer.iter_messages("chat.txt"):
+                print(date_time, author, len(text))
+            ```
+        """
+        if is_stream(filename):
+            # The format is detected from the first lines of the stream.
+            with open_chat(filename) as file:
+                yield from self.parse_lines(file)
+            return
+        if self.__backend == "mmap":
+            yield from self.iter_mapped_messages(filename)
+            return
+        chat_format = self.__chat_format or detect_file_format(filename)
+        with open(filename, "r", encoding="utf-8-sig") as file:
+            yield from self.parse_lines(file, chat_format)
+
+    def iter_mapped_messages(self, filename) -> Iterator[tuple[datetime, str, str]]:
+        """
+        Maps a chat file in memory and yields one (date_time, author,
+        text) record per message, like iter_messages.
+
+        Notes:
+            - Without a chat_format, the format is detected from the
+            start of the file (see formats.detect_file_format).
+            - The headers are found with the `header_bytes_pattern` of the format over
+            the whole buffer, so lines are never iterated one by one.
+            The pattern starts with the newline that precedes a header,
+            which lets the regex engine skip quickly to candidate lines.
+            The first line is checked with `first_header_bytes_pattern`.
+            - Only the author names and the message bodies are decoded.
+            The continuation lines of a message are decoded as one slice.
+            - Timestamps are converted through a cache keyed by the raw bytes.
+        """
+        with open(filename, "rb") as file:
+            if getsize(filename) == 0:
+                return
+            with mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+                position = len(BOM) if buffer[:len(BOM)] == BOM else 0
+                chat_format = self.__chat_format or detect_file_format(filename)
+                self.__use_format(chat_format)
+                matches = chat_format.header_bytes_pattern.finditer(buffer, position)
+                first_match = chat_format.first_header_bytes_pattern.match(buffer, position)
+                if first_match is not None:
+                    matches = chain((first_match,), matches)
+                current_author = ""
+                current_date_time = None
+                current_parts = None
+                try:
+                    for match in matches:
+                        start = match.start("start")
+                        if start > position and current_parts is not None:
+                            current_parts.append(decode_lines(buffer[position:start]))
+                        # Skip the newline at the end of the header line.
+                        position = match.end() + 1
+                        date_bytes, time_bytes, author, message = \
+                            match.group("date", "time", "author", "message")
+                        if author is None:
+                            continue
+                        if current_parts:
+                            text = "".join(current_parts)
+                            if text:
+                                yield current_date_time, current_author, text
+                        current_parts = None
+                        author = author.decode("utf8")
+                        date_time = self.__select(author, date_bytes, time_bytes)
+                        if date_time is None:
+                            continue
+                        if date_time is STOP:
+                            break
+                        current_author = author
+                        current_date_time = date_time
+                        current_parts = [message.decode("utf8") if message else ""]
+                finally:
+                    # The matches hold the buffer, which cannot be closed while
+                    # they exist, even when the consumer stops the generator early.
+                    matches = first_match = match = None
+                if len(buffer) > position and current_parts is not None:
+                    current_parts.append(decode_lines(buffer[position:]))
+                if current_parts:
+                    text = "".join(current_parts)
+                    if text:
+                        yield current_date_time, current_author, text
+
+    def __bytes_to_datetime(self, date_bytes: bytes, time_bytes: bytes) -> datetime:
+        "Converts the raw date and time of a header, caching by the bytes."
+        key = (date_bytes, time_bytes)
+        date_time = self.__bytes_datetimes.get(key)
+        if date_time is None:
+            date_time = self.to_datetime(date_bytes.decode("ascii"), time_bytes.decode("utf8"))
+            if len(self.__bytes_datetimes) >= DATETIME_CACHE_SIZE:
+                self.__bytes_datetimes.clear()
+            self.__bytes_datetimes[key] = date_time
+        return date_time
+
     def process_file(self, filename) -> None:
         """
         Reads a text file and extracts the relevant data to create a Chat object.
@@ -94,36 +430,12 @@ class WhatsappLexicalAnalyzer:
 
         Notes:
             - The file must be in UTF-8 encoding.
-            - The function iterates through each line of the file.
-            - For each line, it extracts the date/time, author, and message.
-            - If the date/time and author are not present, it is 
-            considered a continuation of the previous message.
+            - The messages are read with `iter_messages`.
             - The extracted data is used to create Message objects 
             that are appended to the Chat object.
         """
-        with open(filename, "r", encoding="utf8") as file:
-            current_author = ""
-            current_date_time = None
-            current_text = ""
-            for line in file:
-                date_time = self.extract_datetime(line)
-                author = self.extract_author(line)
-                if date_time is None and author == "":
-                    current_text += line
-                    continue
-                if author == "":
-                    continue
-                if current_text:
-                    self.__chat.register_message(
-                        current_author, Message(current_date_time, current_text)
-                    )
-                current_author = author
-                current_date_time = date_time
-                current_text = self.extract_message(line)
-            if current_text:
-                self.__chat.register_message(
-                    current_author, Message(current_date_time, current_text)
-                )
+        for date_time, author, text in self.iter_messages(filename):
+            self.__chat.register_message(author, Message(date_time, text))
 
     def get_chat(self) -> Chat:
         """
@@ -148,32 +460,438 @@ class WhatsappLexicalAnalyzer:
         self.__chat = Chat()
         return chat
 
+def load_resources(tokenizer: str = "nltk", sentiment: bool = False) -> None:
+    """
+    Loads the stop words, the tokenizer and the VADER lexicon,
+    so the chats analyzed afterwards in this process reuse them.
+    It is the initializer of the worker processes of the batch
+    analyzer and of the server.
+    """
+    from models import tokenize
+    from sentiment import get_sentiment_analyzer
+    from stopwords import get_stopwords
+
+    set_tokenizer(tokenizer)
+    get_stopwords()
+    tokenize("hola")
+    if sentiment:
+        get_sentiment_analyzer()
+
+def is_stream(filename: str) -> bool:
+    """
+    Determines if a chat can only be read as a stream, from start to
+    end: the standard input and the compressed files. They cannot be
+    mapped in memory, split in chunks or resumed from an offset.
+    """
+    return filename == STDIN or filename.lower().endswith(COMPRESSED_SUFFIXES)
+
+def find_chat_member(archive: ZipFile) -> str:
+    """
+    Returns the name of the chat in a .zip export: `_chat.txt`,
+    or else the largest .txt file of the archive.
+
+    Raises:
+        FileNotFoundError: If the archive has no .txt file.
+    """
+    members = [
+        member for member in archive.infolist()
+        if not member.is_dir() and member.filename.lower().endswith(".txt")
+    ]
+    for member in members:
+        if basename(member.filename) == ZIP_CHAT_NAME:
+            return member.filename
+    if not members:
+        raise FileNotFoundError(f"El archivo {archive.filename} no contiene ningún chat.")
+    return max(members, key=lambda member: member.file_size).filename
+
+@contextmanager
+def open_chat(filename: str) -> Iterator[TextIO]:
+    """
+    Opens a chat as a text stream: a plain text file, the chat of a
+    .zip export, a gzipped file, or the standard input for "-". The
+    compressed files are decompressed as they are read, so they are
+    never extracted on disk or loaded whole in memory.
+    """
+    if filename == STDIN:
+        stream = TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+        try:
+            yield stream
+        finally:
+            # Leaves the standard input open.
+            stream.detach()
+    elif filename.lower().endswith(".gz"):
+        with gzip.open(filename, "rt", encoding="utf-8-sig") as file:
+            yield file
+    elif filename.lower().endswith(".zip"):
+        with ZipFile(filename) as archive, archive.open(find_chat_member(archive)) as member:
+            yield TextIOWrapper(member, encoding="utf-8-sig")
+    else:
+        with open(filename, "r", encoding="utf-8-sig") as file:
+            yield file
+
+CHUNK_SIZE = 32 * 1024 * 1024
+
+def count_lines(filename: str) -> int:
+    "Returns the number of lines of a file."
+    lines = 0
+    last_block = b""
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+            lines += block.count(b"\n")
+            last_block = block
+    if last_block and not last_block.endswith(b"\n"):
+        lines += 1
+    return lines
+
+def decode_lines(data: bytes) -> str:
+    "Decodes a slice of complete lines, translating line endings to \\n."
+    text = data.decode("utf8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    return text
+
+class OffsetLineReader:
+    """
+    Iterates over the decoded lines of a binary file, starting at
+    a byte offset, and keeps the offset where the last line read
+    starts. Line endings are translated to "\\n", as in text mode.
+
+    Parameters:
+        - file: a file opened in binary mode
+        - offset: int
+    """
+
+    def __init__(self, file: BinaryIO, offset: int = 0) -> None:
+        self.__file = file
+        self.__offset = offset
+        self.line_offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        self.__file.seek(self.__offset)
+        for line in self.__file:
+            self.line_offset = self.__offset
+            self.__offset += len(line)
+            if self.line_offset == 0 and line.startswith(BOM):
+                line = line[len(BOM):]
+            if line.endswith(b"\r\n"):
+                line = line[:-2] + b"\n"
+            yield line.decode("utf8")
+
+
+def is_message_header(line: str, chat_format: ChatFormat = ANDROID) -> bool:
+    "Determines if a line starts a new message (a date/time and an author)."
+    match = chat_format.line_pattern.match(line)
+    return match is not None and match.group("author") is not None
+
+def find_chunks(
+    filename: str, chunks: int, chat_format: ChatFormat = ANDROID
+) -> list[tuple[int, int]]:
+    """
+    Splits a chat file into at most `chunks` byte ranges of similar
+    size. Every range, except the first one, starts at a message
+    header of the given format, so each one can be parsed on its own.
+
+    Returns:
+        - A list of (start, end) byte offsets covering the whole file.
+    """
+    size = getsize(filename)
+    boundaries = [0]
+    with open(filename, "rb") as file:
+        for i in range(1, chunks):
+            target = size * i // chunks
+            if target <= boundaries[-1]:
+                continue
+            file.seek(target)
+            # Skip the rest of the line where the target offset fell.
+            file.readline()
+            position = file.tell()
+            for line in file:
+                if is_message_header(line.decode("utf8", errors="replace"), chat_format):
+                    break
+                position += len(line)
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def summarize_chunk(
+    filename: str, start: int, end: int,
+    tokenizer: str = "nltk", sentiment: bool = False,
+    message_filter: Optional[MessageFilter] = None,
+    approximate: Optional[int] = None, chat_format: Optional[ChatFormat] = None
+) -> ChatSummary:
+    """
+    Parses the messages between two byte offsets of a chat file
+    and returns their aggregates. It runs in the worker processes
+    of WhatsappStatisticalAnalyzer when more than one job is used,
+    with the format detected once from the start of the file.
+    """
+    set_tokenizer(tokenizer)
+    with open(filename, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    lines = TextIOWrapper(BytesIO(data), encoding="utf-8-sig")
+    summary = ChatSummary(sentiment, approximate)
+    lanalyzer = WhatsappLexicalAnalyzer(message_filter=message_filter, chat_format=chat_format)
+    for date_time, author, text in lanalyzer.parse_lines(lines):
+        summary.register_message(author, Message(date_time, text))
+    if summary.sentiment is not None:
+        summary.sentiment.flush()
+    return summary
+
 class WhatsappStatisticalAnalyzer:
 
     """
     The WhatsappAnalyzer class processes a 
     WhatsApp chat log file and generates a summary report.
+
+    The messages are streamed into a ChatSummary, which keeps
+    only the per-author aggregates needed by the report, so the
+    memory used does not grow with the number of messages.
+    With jobs > 1, the file is split at message boundaries and
+    the chunks are summarized in several processes.
+    With a cache_dir, the summary is saved on disk and reused
+    while the contents of the file do not change.
+    With incremental, the progress is saved next to the file and
+    the next run only parses the messages appended since then.
+    The tokenizer ("nltk" or "fast") is passed to models.set_tokenizer.
+    The word clouds are rendered unless images is False, for the
+    authors with at least min_messages messages, in a pool of
+    image_jobs processes (or threads with image_threads). They are
+    cached in the cache_dir, or in the results folder without one.
+    With a profiler (see profiling.Profiler), the time, CPU, peak
+    memory and item counts of each stage are recorded in it. Without
+    one, the stages are measured by a no-op NULL_PROFILER.
+    The file can also be a .zip export, a .gz file or "-" for the
+    standard input (see open_chat). They are read once, as a stream,
+    so jobs, incremental and the "mmap" backend do not apply to them,
+    and the standard input is not cached.
+    The output_format selects the builder of the report (see
+    results.get_builder), and output the file it writes.
+    With chat_ranking, the report also ranks the words and emojis of
+    the whole chat and the words distinctive of each author.
+    With a message_filter, only the selected messages are analyzed;
+    the selection is part of the cache key and of the incremental state.
+    With sentiment, the messages are also scored with VADER, in
+    batches sent to a pool of `sentiment_jobs` processes (or in the
+    current process if it is 0), and the report shows the sentiment
+    of each author and of each day.
+    The layout of the message headers (Android or iOS, with their date
+    and clock variants) is detected from the first lines of the file.
+    With approximate, the words and emojis of each author are counted
+    in Space-Saving sketches of that many terms (see sketches), which
+    bounds the memory used; the report then shows the error bounds.
     """
 
-    def __init__(self, file: str, words: int, emojis: int) -> None:
-        if not exists(file):
+    def __init__(
+        self, file: str, words: int, emojis: int,
+        jobs: int = 1, cache_dir: Optional[str] = None,
+        incremental: bool = False, backend: str = "text",
+        tokenizer: str = "nltk", sentiment: bool = False,
+        sentiment_jobs: int = 0, message_filter: Optional[MessageFilter] = None,
+        chat_ranking: bool = False, images: bool = True,
+        image_jobs: int = 1, image_threads: bool = False,
+        min_messages: int = 0, output_format: str = "console",
+        output: Optional[str] = None, profiler: Optional[Profiler] = None,
+        approximate: Optional[int] = None
+    ) -> None:
+        if file != STDIN and not exists(file):
             raise FileNotFoundError(f"El archivo {file} no existe.")
+        set_tokenizer(tokenizer)
+        self.__builder = get_builder(output_format, output)
+        self.__profiler = profiler or NULL_PROFILER
+        self.__tokenizer = tokenizer
+        self.__sentiment = sentiment
+        self.__sentiment_jobs = sentiment_jobs
+        self.__filter = message_filter or MessageFilter()
+        self.__approximate = approximate
+        # The summaries saved for other selections or sketch sizes are not reused.
+        self.__selection = self.__filter.get_key()
+        if approximate is not None:
+            self.__selection += f";approximate={approximate}"
 
         self.__parameters = {}
         self.__parameters["words"] = words if words > 0 else 20
         self.__parameters["emojis"] = emojis if emojis > 0 else 10
+        self.__parameters["sentiment"] = sentiment
+        self.__parameters["chat"] = chat_ranking
+        self.__parameters["images"] = images
+        self.__parameters["image_jobs"] = image_jobs
+        self.__parameters["image_threads"] = image_threads
+        self.__parameters["min_messages"] = min_messages
+        self.__parameters["image_cache"] = \
+            join(cache_dir, "images") if cache_dir else IMAGE_CACHE_DIRECTORY
+
+        self.__lanalyzer = WhatsappLexicalAnalyzer(backend, self.__filter)
+        # The standard input cannot be read twice, to hash it and to parse it.
+        cache = AnalysisCache(cache_dir) if cache_dir and file != STDIN else None
+        self.__summary = None
+        if cache:
+            with self.__profiler.stage("cache"):
+                key = cache.get_key(file, self.__selection)
+                self.__summary = self.__check_summary(cache.load(key))
+        if self.__summary is None:
+            with self.__profiler.stage("summarize"):
+                if incremental and not is_stream(file):
+                    self.__summary = self.__summarize_incrementally(file)
+                else:
+                    self.__summary = self.__summarize(file, jobs)
+            self.__profiler.count(
+                "summarize", messages=sum(author.messages for author in self.__summary.authors)
+            )
+            if cache:
+                with self.__profiler.stage("cache"):
+                    cache.store(key, self.__summary)
+
+    @property
+    def summary(self) -> ChatSummary:
+        "Returns the aggregates of the analyzed chat."
+        return self.__summary
+
+    @property
+    def profiler(self) -> Union[Profiler, NullProfiler]:
+        "Returns the profiler that measures the stages of the analysis."
+        return self.__profiler
 
-        self.__lanalyzer = WhatsappLexicalAnalyzer()
-        self.__lanalyzer.process_file(file)
+    def __check_summary(self, summary: Optional[ChatSummary]) -> Optional[ChatSummary]:
+        "Discards a saved summary that lacks the sentiment scores requested."
+        if summary is not None and self.__sentiment and summary.sentiment is None:
+            return None
+        return summary
 
-        self.__console_builder = ConsoleBuilder()
+    @contextmanager
+    def __scoring_pool(self, summary: ChatSummary) -> Iterator[None]:
+        """
+        Scores the sentiment of the summary in a pool of processes
+        while the block runs, and waits for the last batches at the end.
+        """
+        if summary.sentiment is None:
+            yield
+            return
+        if self.__sentiment_jobs < 1:
+            yield
+            summary.sentiment.flush()
+            return
+        with ProcessPoolExecutor(max_workers=self.__sentiment_jobs) as executor:
+            summary.sentiment.set_executor(executor, self.__sentiment_jobs)
+            yield
+            summary.sentiment.set_executor(None)
+
+    def __summarize(self, file: str, jobs: int) -> ChatSummary:
+        "Parses the file and returns the aggregates of each author."
+        if jobs > 1 and not is_stream(file):
+            return self.__summarize_in_parallel(file, jobs)
+        if self.__profiler.enabled:
+            return self.__summarize_with_profiler(file)
+        summary = ChatSummary(self.__sentiment, self.__approximate)
+        with self.__scoring_pool(summary):
+            for date_time, author, text in self.__lanalyzer.iter_messages(file):
+                summary.register_message(author, Message(date_time, text))
+        return summary
+
+    def __summarize_with_profiler(self, file: str) -> ChatSummary:
+        """
+        Does the same as the serial path of __summarize, measuring
+        apart the time spent parsing, extracting the features of
+        each message (tokens, emojis and words) and counting them.
+        It is only used when profiling, since it times every message.
+        """
+        profiler = self.__profiler
+        parse_timer = profiler.timer("parse")
+        count_timer = profiler.timer("count")
+        summary = ChatSummary(self.__sentiment, self.__approximate)
+        messages = 0
+        with self.__scoring_pool(summary):
+            records = self.__lanalyzer.iter_messages(file)
+            while True:
+                with parse_timer:
+                    record = next(records, None)
+                if record is None:
+                    break
+                date_time, author, text = record
+                message = Message(date_time, text)
+                message.extract_features(profiler)
+                with count_timer:
+                    summary.register_message(author, message)
+                messages += 1
+        if is_stream(file):
+            profiler.count("parse", messages=messages)
+        else:
+            profiler.count("parse", lines=count_lines(file), messages=messages)
+        return summary
+
+    def __summarize_incrementally(self, file: str) -> ChatSummary:
+        """
+        Continues the analysis saved in the sidecar state of the
+        file: only the bytes after the last analyzed message are
+        parsed, and the new messages are added to the saved summary.
+        The last message is parsed again on every run, because it
+        may have received continuation lines since the last one.
+        """
+        # The reader must not look ahead of each message, so the format
+        # is detected from the start of the file instead of from the lines.
+        chat_format = detect_file_format(file)
+        lanalyzer = WhatsappLexicalAnalyzer(message_filter=self.__filter, chat_format=chat_format)
+        # The appended lines may tell the day from the month for the first
+        # time. A state saved with another format is then analyzed again.
+        state = IncrementalState(file, f"{self.__selection};format={chat_format.name}")
+        summary, offset = state.load() or (None, 0)
+        if self.__check_summary(summary) is None:
+            summary, offset = ChatSummary(self.__sentiment, self.__approximate), 0
+        last_author, last_message = "", None
+        last_offset = offset
+        with self.__scoring_pool(summary), open(file, "rb") as binary_file:
+            lines = OffsetLineReader(binary_file, offset)
+            message_offset = offset
+            for date_time, author, text in lanalyzer.parse_lines(lines):
+                if last_message is not None:
+                    summary.register_message(last_author, last_message)
+                last_author, last_message = author, Message(date_time, text)
+                last_offset = message_offset
+                # The record was yielded when the header of the next message was read.
+                message_offset = lines.line_offset
+            state.store(summary, last_offset)
+            if last_message is not None:
+                summary.register_message(last_author, last_message)
+        return summary
+
+    def __summarize_in_parallel(self, file: str, jobs: int) -> ChatSummary:
+        """
+        Splits the file at message boundaries and summarizes each
+        chunk in a pool of `jobs` processes. The partial summaries
+        are merged in file order, so the result is the same as
+        the one obtained by a single process.
+        """
+        chunks = max(jobs, getsize(file) // CHUNK_SIZE)
+        chat_format = detect_file_format(file)
+        starts, ends = zip(*find_chunks(file, chunks, chat_format))
+        summary = ChatSummary(self.__sentiment, self.__approximate)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            partials = executor.map(
+                summarize_chunk, repeat(file), starts, ends,
+                repeat(self.__tokenizer), repeat(self.__sentiment), repeat(self.__filter),
+                repeat(self.__approximate), repeat(chat_format)
+            )
+            for partial in partials:
+                summary.merge(partial)
+        return summary
 
     def print_summary(self) -> None:
         """
-        Generates a summary report of the chat log file
-        and prints it to the console.
+        Generates a summary report of the chat log file and
+        prints it to the console, or writes it to the output
+        in the output_format ("jsonl" or "columnar").
+        The word clouds are built apart from the rest of the
+        report, so the profiler measures them separately.
         """
-        self.__console_builder.set_chat(self.__lanalyzer.get_chat())
-        self.__console_builder.set_parameters(self.__parameters)
-        self.__console_builder.build_all()
-        self.__console_builder.print_results()
+        with self.__profiler.stage("aggregate"):
+            self.__builder.set_chat(self.__summary)
+        self.__builder.set_parameters({**self.__parameters, "images": False})
+        with self.__profiler.stage("report"):
+            self.__builder.build_all()
+        if self.__parameters["images"]:
+            self.__builder.set_parameters(self.__parameters)
+            with self.__profiler.stage("images"):
+                self.__builder.build_images()
+        with self.__profiler.stage("output"):
+            self.__builder.print_results()
@@ -0,0 +1,228 @@
+"""
+batch_analyzer - analyze many WhatsApp chats at once
+
+This module provides a command-line interface to analyze a directory
+(or a glob) of chat exports in one run. The NLP resources (stop words,
+the nltk tokenizer and, with `--sentiment`, the VADER lexicon) are
+loaded once in the main process and once per worker, instead of once
+per chat, and the chats are spread across a pool of processes. The
+largest files are submitted first and each worker takes the next
+pending chat as soon as it finishes one, so a few big groups do not
+leave the other cores idle at the end of the run.
+
+Each chat gets its own report (JSON Lines or numpy columns, see
+`results`) in the output directory, and `index.json` lists every
+chat with its report, size, number of messages and authors, time
+spent and, if it failed, the error.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies:
+- concurrent
+- glob
+- hashlib
+- json
+- os
+- time
+- typing
+- typer
+- analyzer (custom module)
+
+Usage:
+- `python batch_analyzer.py exports/ --jobs 8`
+- `python batch_analyzer.py "exports/**/*.txt" --output-dir reports --format columnar`
+
+Options:
+- `paths`: Directories (every `*.txt`, `*.zip` and `*.gz` inside them,
+  recursively) or glob patterns.
+- `--jobs`, `-j`: Number of processes (default: the number of CPUs).
+- `--output-dir`, `-o`: Directory of the reports and the index (default: `results/batch`).
+- `--format`, `-f`: `jsonl` (default) or `columnar`.
+- `--words`, `-w` / `--emojis`, `-e`: Number of words and emojis of the chat rankings.
+- `--cache-dir`, `-c`: Directory where the analyses are cached.
+- `--fast-tokenizer`, `--sentiment`, `-s`, `--global`, `-g`: As in `chat_analyzer.py`.
+- `--images`: Also render the word clouds (they are skipped by default).
+- `--approximate`: As in `chat_analyzer.py`.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from hashlib import blake2b
+import json
+import os
+from time import perf_counter
+from typing import List, Optional
+
+from typer import run, Option, Argument, BadParameter
+
+BATCH_FORMATS = ("jsonl", "columnar")
+EXTENSIONS = {"jsonl": ".jsonl", "columnar": ".npz"}
+CHAT_PATTERNS = ("*.txt", "*.zip", "*.gz")
+
+def find_chats(paths: list[str]) -> list[str]:
+    """
+    Returns the chat files of the given directories or glob
+    patterns, without duplicates, from the largest to the smallest.
+    """
+    files = dict[str, None]()
+    for path in paths:
+        if os.path.isdir(path):
+            matches = [
+                match for pattern in CHAT_PATTERNS
+                for match in glob(os.path.join(path, "**", pattern), recursive=True)
+            ]
+        else:
+            matches = glob(path, recursive=True)
+        for match in sorted(matches):
+            if os.path.isfile(match):
+                files[os.path.abspath(match)] = None
+    return sorted(files, key=os.path.getsize, reverse=True)
+
+def get_report_path(output_dir: str, filename: str, output_format: str) -> str:
+    """
+    Returns the path of the report of a chat: the name of the file
+    and a short hash of its path, so chats with the same name in
+    different directories do not overwrite each other.
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    suffix = blake2b(filename.encode("utf8"), digest_size=4).hexdigest()
+    return os.path.join(output_dir, f"{name}_{suffix}{EXTENSIONS[output_format]}")
+
+def analyze_chat(filename: str, report: str, options: dict) -> dict:
+    """
+    Analyzes one chat and writes its report. Returns its entry
+    of the index; errors are reported there instead of raised,
+    so one broken export does not stop the batch.
+    """
+    from analyzer import WhatsappStatisticalAnalyzer
+
+    entry = {"file": filename, "report": report, "bytes": os.path.getsize(filename)}
+    start = perf_counter()
+    try:
+        analyzer = WhatsappStatisticalAnalyzer(filename, output=report, **options)
+        analyzer.print_summary()
+        authors = analyzer.summary.authors
+        entry["messages"] = sum(author.messages for author in authors)
+        entry["authors"] = len(authors)
+    except Exception as error:
+        entry["report"] = None
+        entry["error"] = f"{type(error).__name__}: {error}"
+    entry["seconds"] = perf_counter() - start
+    return entry
+
+def analyze_chats(files: list[str], output_dir: str, jobs: int, options: dict) -> list[dict]:
+    """
+    Analyzes the chats in a pool of `jobs` processes, or in this
+    process if jobs is 1, and returns their index entries in the
+    order of `files`. The files must be sorted from the largest.
+    """
+    from analyzer import load_resources
+
+    reports = [get_report_path(output_dir, filename, options["output_format"]) for filename in files]
+    load_resources(options["tokenizer"], options["sentiment"])
+    if jobs <= 1:
+        return [
+            analyze_chat(filename, report, options) for filename, report in zip(files, reports)
+        ]
+    entries = [None] * len(files)
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=load_resources,
+        initargs=(options["tokenizer"], options["sentiment"])
+    ) as executor:
+        # The pool keeps a single queue of pending chats, which idle
+        # workers take in order, so the largest chats start first.
+        futures = {
+            executor.submit(analyze_chat, filename, report, options): i
+            for i, (filename, report) in enumerate(zip(files, reports))
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry = future.result()
+            entries[futures[future]] = entry
+            status = entry.get("error", f"{entry['seconds']:.2f} s")
+            print(f"[{done}/{len(files)}] {entry['file']}: {status}")
+    return entries
+
+def write_index(output_dir: str, entries: list[dict], seconds: float) -> str:
+    "Writes the combined index of the batch and returns its path."
+    path = os.path.join(output_dir, "index.json")
+    index = {
+        "chats": len(entries),
+        "failed": sum(1 for entry in entries if "error" in entry),
+        "messages": sum(entry.get("messages", 0) for entry in entries),
+        "seconds": seconds,
+        "entries": entries,
+    }
+    with open(path, "w", encoding="utf8") as file:
+        json.dump(index, file, ensure_ascii=False, indent=2)
+        file.write("\n")
+    return path
+
+def format_callback(output_format: str) -> str:
+    """
+    format_callback
+        Checks that the format of the reports is known.
+
+    Raises:
+        BadParameter: If the format is not jsonl or columnar.
+    """
+    if output_format not in BATCH_FORMATS:
+        raise BadParameter(f"El formato {output_format} no existe, usa uno de {BATCH_FORMATS}.")
+    return output_format
+
+def main(
+    paths: List[str] = Argument(..., help="Directories or glob patterns of chat exports."),
+    jobs: int = Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="Number of processes."
+    ),
+    output_dir: str = Option(
+        os.path.join("results", "batch"), "--output-dir", "-o",
+        help="Directory of the reports and the index."
+    ),
+    output_format: str = Option(
+        "jsonl", "--format", "-f", help="jsonl or columnar.", callback=format_callback
+    ),
+    words: int = Option(
+        30, "--words", "-w", help="Number of words of the chat rankings."
+    ),
+    emojis: int = Option(
+        15, "--emojis", "-e", help="Number of emojis of the chat rankings."
+    ),
+    cache_dir: Optional[str] = Option(
+        None, "--cache-dir", "-c", help="Directory where the analyses are cached."
+    ),
+    fast_tokenizer: bool = Option(
+        False, "--fast-tokenizer", help="Split words with a regex instead of nltk."
+    ),
+    sentiment: bool = Option(
+        False, "--sentiment", "-s", help="Score the sentiment of each author and day."
+    ),
+    chat_ranking: bool = Option(
+        False, "--global", "-g", help="Add the rankings of the whole chat."
+    ),
+    images: bool = Option(
+        False, "--images", help="Also render the word clouds."
+    ),
+    approximate: Optional[int] = Option(
+        None, "--approximate", min=1,
+        help="Count words and emojis approximately, keeping this many terms per author."
+    )
+):
+    files = find_chats(paths)
+    if not files:
+        raise BadParameter("No se encontraron chats.")
+    os.makedirs(output_dir, exist_ok=True)
+    options = {
+        "words": words, "emojis": emojis, "cache_dir": cache_dir,
+        "tokenizer": "fast" if fast_tokenizer else "nltk",
+        "sentiment": sentiment, "chat_ranking": chat_ranking,
+        "images": images, "output_format": output_format,
+        "approximate": approximate,
+    }
+    start = perf_counter()
+    entries = analyze_chats(files, output_dir, min(jobs, len(files)), options)
+    index = write_index(output_dir, entries, perf_counter() - start)
+    failed = sum(1 for entry in entries if "error" in entry)
+    print(f"{len(entries) - failed} chats analizados, {failed} con errores. Índice: {index}")
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,102 @@
+"""
+generator - synthetic WhatsApp chat exports
+
+This script writes chat exports in the format read by
+`WhatsappLexicalAnalyzer`, with the size and the shape of the
+messages under control, so benchmarks are reproducible: the same
+options and seed always produce the same file.
+
+The shape of the chat is set with:
+- the number of messages and of authors;
+- the ratio of messages with continuation lines;
+- the emoji density (ratio of messages with emojis);
+- the language mix (ratio of messages in English, the rest in Spanish);
+- the ratio of multimedia messages and system notifications.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/generator.py chat.txt --messages 100000`
+  from the root of the repository.
+- It is also imported by `benchmarks/suite.py`.
+"""
+
+from datetime import datetime, timedelta
+import random
+
+from typer import run, Option, Argument
+
+SPANISH_WORDS = (
+    "hola que tal bien gracias jajaja perro gato casa trabajo mañana hoy fiesta "
+    "comida bueno niño año amigo llamar después tarde noche semana también ahora "
+    "nunca siempre vamos quiero puedes dónde cuándo verdad claro mucho poco"
+).split()
+ENGLISH_WORDS = (
+    "hello good bad thanks today tomorrow work home party food friend call later "
+    "night week always never want where when really sure much little don't can't "
+    "meeting weekend game movie"
+).split()
+EMOJIS = ("😀", "😂", "❤️", "👍", "🎉", "🇪🇨", "🙏", "😍", "🔥", "😢")
+FIRST_NAMES = ("Ana", "Juan", "María", "José", "Luis", "Carmen", "Pedro", "Lucía", "Diego", "Sofía")
+
+def get_authors(count: int) -> list[str]:
+    "Returns `count` distinct author names, with some phone numbers among them."
+    authors = []
+    for i in range(count):
+        if i % 7 == 6:
+            authors.append(f"+593 99 {100 + i // 1000:03d} {i % 10000:04d}")
+        else:
+            authors.append(f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {i // len(FIRST_NAMES) + 1}")
+    return authors
+
+def get_sentence(rng: random.Random, words: tuple[str, ...], longest: int) -> str:
+    "Returns a sentence of 1 to `longest` random words."
+    return " ".join(rng.choices(words, k=rng.randint(1, longest)))
+
+def generate_chat(
+    filename: str, messages: int = 10000, authors: int = 8,
+    multiline: float = 0.1, emojis: float = 0.3, english: float = 0.2,
+    multimedia: float = 0.05, system: float = 0.02, seed: int = 7
+) -> None:
+    """
+    Writes a synthetic chat export with `messages` messages.
+    Timestamps grow from 1/1/21 in steps of 0 to 30 minutes, so the
+    export is chronological, like the real ones.
+    """
+    rng = random.Random(seed)
+    names = get_authors(authors)
+    spanish, english_words = tuple(SPANISH_WORDS), tuple(ENGLISH_WORDS)
+    date_time = datetime(2021, 1, 1)
+    with open(filename, "w", encoding="utf8") as file:
+        for _ in range(messages):
+            date_time += timedelta(minutes=rng.randint(0, 30))
+            stamp = f"{date_time.day}/{date_time.month}/{date_time:%y}, {date_time:%H:%M}"
+            author = rng.choice(names)
+            if rng.random() < system:
+                file.write(f"{stamp} - {author} se unió usando el enlace de invitación\n")
+                continue
+            if rng.random() < multimedia:
+                file.write(f"{stamp} - {author}: <Multimedia omitido>\n")
+                continue
+            words = english_words if rng.random() < english else spanish
+            body = get_sentence(rng, words, 12)
+            if rng.random() < emojis:
+                body += " " + rng.choice(EMOJIS) * rng.randint(1, 3)
+            file.write(f"{stamp} - {author}: {body}\n")
+            if rng.random() < multiline:
+                for _ in range(rng.randint(1, 5)):
+                    file.write(get_sentence(rng, words, 10) + "\n")
+
+def main(
+    filename: str = Argument(..., help="File where the chat is written."),
+    messages: int = Option(10000, "--messages", "-m", help="Number of messages."),
+    authors: int = Option(8, "--authors", "-a", help="Number of authors."),
+    multiline: float = Option(0.1, "--multiline", help="Ratio of multi-line messages."),
+    emojis: float = Option(0.3, "--emojis", help="Ratio of messages with emojis."),
+    english: float = Option(0.2, "--english", help="Ratio of messages in English."),
+    seed: int = Option(7, "--seed", help="Seed of the random generator.")
+):
+    generate_chat(filename, messages, authors, multiline, emojis, english, seed=seed)
+
+if __name__ == "__main__":
+    run(main)
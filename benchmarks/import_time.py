@@ -0,0 +1,61 @@
+"""
+import_time - benchmark for the startup time of the command line
+
+This script spawns fresh python processes and measures how long they
+take to start the command line interface or to import the analysis
+modules. Batch wrappers spawn `chat_analyzer.py` thousands of times,
+so `--help`, `--install` and the import of the modules must stay
+cheap: nltk, wordcloud and the VADER lexicon are only loaded when
+they are used.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/import_time.py` from the root of the repository.
+- Run `python -X importtime chat_analyzer.py --help` to see the
+  detail of a single import.
+"""
+
+import os
+import subprocess
+import sys
+from statistics import mean
+from time import perf_counter
+
+from typer import run, Option
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "python (baseline)": [sys.executable, "-c", "pass"],
+    "chat_analyzer.py --help": [sys.executable, "chat_analyzer.py", "--help"],
+    "import analyzer": [sys.executable, "-c", "import analyzer"],
+    "import models": [sys.executable, "-c", "import models"],
+    "load stopwords": [
+        sys.executable, "-c", "import stopwords; stopwords.get_stopwords()"
+    ],
+}
+
+def time_command(command: list[str], repeat: int) -> list[float]:
+    "Returns the wall time in seconds of each run of the command."
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        subprocess.run(
+            command, cwd=ROOT, check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        times.append(perf_counter() - start)
+    return times
+
+def main(
+    repeat: int = Option(
+        10, "--repeat", "-r", help="Number of runs of each command."
+    )
+):
+    for name, command in COMMANDS.items():
+        times = time_command(command, repeat)
+        print(f"{name:<26} min {min(times) * 1000:8.1f} ms  mean {mean(times) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,74 @@
+"""
+multiline - benchmark for long multi-line messages
+
+This script writes a chat export whose messages span thousands of
+lines (pasted logs, code, forwarded articles) and measures how long
+`WhatsappLexicalAnalyzer.process_file` takes to parse it. The number
+of lines per message is doubled on every round, so the time per line
+must stay roughly constant: if it grows with the size of the message,
+continuation lines are being concatenated in quadratic time.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/multiline.py` from the root of the repository.
+- Use `--messages` and `--lines` to change the size of the fixture.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from typer import run, Option
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import WhatsappLexicalAnalyzer
+
+LOG_LINE = "2023-01-01 12:00:00,000 INFO worker-3 procesando lote número 42 😀\n"
+
+def write_fixture(filename: str, messages: int, lines: int) -> None:
+    """
+    Writes a chat with `messages` messages, each one followed
+    by `lines` continuation lines.
+    """
+    with open(filename, "w", encoding="utf8") as file:
+        for i in range(messages):
+            file.write(f"1/1/23, 12:{i % 60:02d} - Autor {i % 3}: Mira este log:\n")
+            file.write(LOG_LINE * lines)
+
+def time_parse(filename: str) -> float:
+    "Returns the seconds spent by process_file on the given chat."
+    analyzer = WhatsappLexicalAnalyzer()
+    start = perf_counter()
+    analyzer.process_file(filename)
+    elapsed = perf_counter() - start
+    analyzer.get_chat()
+    return elapsed
+
+def main(
+    messages: int = Option(
+        20, "--messages", "-m", help="Number of messages in the fixture."
+    ),
+    lines: int = Option(
+        1000, "--lines", "-l", help="Continuation lines per message in the first round."
+    ),
+    rounds: int = Option(
+        5, "--rounds", "-r", help="Number of rounds, doubling the lines each time."
+    )
+):
+    with TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "multiline_chat.txt")
+        for _ in range(rounds):
+            write_fixture(filename, messages, lines)
+            elapsed = time_parse(filename)
+            total_lines = messages * (lines + 1)
+            print(
+                f"{lines:>8} lines/message: {elapsed:8.3f} s "
+                f"({elapsed / total_lines * 1e6:.3f} µs/line)"
+            )
+            lines *= 2
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,106 @@
+"""
+parser_checks - regression checks of the chat parsers
+
+This script writes small chat exports that once broke the parsers of
+`WhatsappLexicalAnalyzer` and checks that they are read correctly:
+
+- early_close: a generator of the "mmap" backend is stopped after
+  one message (closed, or dropped after a `break`), which must not
+  fail to close the memory map.
+- stream_sample: a gzipped chat longer than the sample of the format
+  detection, whose only date that tells the day from the month is in
+  a system message of the sample, which must be parsed like the plain
+  file, without losing the lines read ahead.
+
+Each check prints "ok" or the reasons it failed. The script exits
+with an error if any check fails.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/parser_checks.py` from the root of the repository.
+"""
+
+import gc
+import gzip
+import os
+import shutil
+import sys
+from tempfile import TemporaryDirectory
+
+from typer import run, Exit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import WhatsappLexicalAnalyzer
+from formats import SAMPLE_LINES
+
+def write_chat(filename: str, messages: int) -> None:
+    "Writes a chat of `messages` Android messages, one per minute."
+    with open(filename, "w", encoding="utf8") as file:
+        for i in range(messages):
+            file.write(f"1/1/23, {i // 60 % 24}:{i % 60:02d} - Autor {i % 3}: mensaje {i}\n")
+
+def check_early_close(directory: str) -> list[str]:
+    "Stops the generators of the mmap backend after their first message."
+    filename = os.path.join(directory, "early_close.txt")
+    write_chat(filename, 10)
+    errors = list[str]()
+    analyzer = WhatsappLexicalAnalyzer("mmap")
+    messages = analyzer.iter_messages(filename)
+    next(messages)
+    try:
+        messages.close()
+    except BufferError as error:
+        errors.append(f"close() raised BufferError: {error}")
+    unraisable = list[str]()
+    hook = sys.unraisablehook
+    sys.unraisablehook = lambda report: unraisable.append(repr(report.exc_value))
+    try:
+        for _ in analyzer.iter_messages(filename):
+            break
+        gc.collect()
+    finally:
+        sys.unraisablehook = hook
+    errors.extend(f"the collected generator raised {error}" for error in unraisable)
+    return errors
+
+def check_stream_sample(directory: str) -> list[str]:
+    "Parses a gzipped chat whose day order is told by a line of the sample."
+    filename = os.path.join(directory, "stream_sample.txt")
+    with open(filename, "w", encoding="utf8") as file:
+        file.write("13/1/20, 9:00 - Los mensajes están cifrados de extremo a extremo.\n")
+        for i in range(3 * SAMPLE_LINES):
+            file.write(f"2/1/20, {i // 60 % 24}:{i % 60:02d} - Autor {i % 3}: mensaje {i}\n")
+    with open(filename, "rb") as source, gzip.open(filename + ".gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    expected = list(WhatsappLexicalAnalyzer().iter_messages(filename))
+    streamed = list(WhatsappLexicalAnalyzer().iter_messages(filename + ".gz"))
+    errors = list[str]()
+    if len(expected) != 3 * SAMPLE_LINES:
+        errors.append(f"the plain file gave {len(expected)} of {3 * SAMPLE_LINES} messages")
+    if streamed != expected:
+        errors.append(f"the gzipped file gave {len(streamed)} messages, not {len(expected)}")
+    return errors
+
+CHECKS = {
+    "early_close": check_early_close,
+    "stream_sample": check_stream_sample,
+}
+
+def main():
+    failed = 0
+    with TemporaryDirectory() as directory:
+        for name, check in CHECKS.items():
+            errors = check(directory)
+            print(f"{name}: {'ok' if not errors else 'FAILED'}")
+            for error in errors:
+                print(f"  {error}")
+            failed += bool(errors)
+    if failed:
+        print(f"{failed} checks failed")
+        raise Exit(1)
+    print("All the checks passed.")
+
+if __name__ == "__main__":
+    run(main)
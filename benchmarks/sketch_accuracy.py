@@ -0,0 +1,118 @@
+"""
+sketch_accuracy - approximate counts compared with the exact ones
+
+This script generates a synthetic chat with `benchmarks/generator.py`,
+analyzes it with exact counts and with Space-Saving sketches of
+several capacities (`--approximate`), and checks for each author and
+for words and emojis that:
+
+- every count is at least the true count, and exceeds it by no more
+  than its error and the error bound of the sketch;
+- every term left out of the sketch appeared at most error-bound times;
+- the error bound is at most N / capacity, for N counted terms.
+
+It also prints how many of the top `--top` terms of the exact ranking
+the sketches keep, and how many terms they store. The sketches are
+checked after the serial analysis and after the parallel one, whose
+partial sketches are merged. The script exits with an error if any
+guarantee does not hold.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/sketch_accuracy.py --messages 50000` from the
+  root of the repository.
+"""
+
+import os
+import sys
+from tempfile import TemporaryDirectory
+from typing import List, Optional
+
+from typer import run, Option, Exit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analyzer import WhatsappStatisticalAnalyzer
+from generator import generate_chat
+
+def summarize(filename: str, jobs: int, approximate: Optional[int]):
+    "Returns the ChatSummary of a chat, with exact or approximate counts."
+    analyzer = WhatsappStatisticalAnalyzer(
+        filename, 10, 10, jobs=jobs, tokenizer="fast", images=False,
+        output_format="jsonl", output=os.devnull, approximate=approximate
+    )
+    return analyzer.summary
+
+def check_sketch(sketch, exact, top: int) -> tuple[list[str], int]:
+    """
+    Returns the guarantees broken by a sketch, compared with the exact
+    counts, and how many of the top terms of the exact ranking it keeps.
+    """
+    errors = list[str]()
+    bound = sketch.error_bound
+    if bound > sketch.total / sketch.capacity:
+        errors.append(f"error bound {bound} > N / capacity")
+    for term, count in sketch.items():
+        true_count = exact.get(term, 0)
+        if not true_count <= count <= true_count + sketch.get_error(term):
+            errors.append(f"{term}: {count} is not within [{true_count}, +{sketch.get_error(term)}]")
+        if sketch.get_error(term) > bound:
+            errors.append(f"{term}: error {sketch.get_error(term)} > bound {bound}")
+    for term, true_count in exact.items():
+        if term not in sketch and true_count > bound:
+            errors.append(f"{term}: missing with {true_count} > bound {bound}")
+    kept = sum(1 for term, _ in exact.most_common(top) if term in sketch)
+    return errors, kept
+
+def main(
+    messages: int = Option(20000, "--messages", "-m", help="Number of messages."),
+    authors: int = Option(8, "--authors", "-a", help="Number of authors."),
+    seed: int = Option(7, "--seed", help="Seed of the random generator."),
+    capacities: Optional[List[int]] = Option(
+        None, "--capacity", "-k", help="Capacity of the sketches (default: 10, 25, 100)."
+    ),
+    top: int = Option(10, "--top", help="Size of the rankings compared."),
+    jobs: int = Option(2, "--jobs", "-j", help="Processes of the parallel analysis.")
+):
+    broken = 0
+    with TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "chat.txt")
+        generate_chat(filename, messages, authors, seed=seed)
+        exact = {
+            author.name: author for author in summarize(filename, 1, None).authors
+        }
+        stored = sum(
+            len(author.get_word_frequency()) + len(author.get_emoji_frequency())
+            for author in exact.values()
+        )
+        print(f"exact: {stored} terms stored")
+        for capacity in capacities or [10, 25, 100]:
+            for mode, mode_jobs in (("serial", 1), ("parallel", jobs)):
+                summary = summarize(filename, mode_jobs, capacity)
+                kept = total = stored = 0
+                for author in summary.authors:
+                    for kind in ("words", "emojis"):
+                        if kind == "words":
+                            sketch = author.get_word_frequency()
+                            exact_counts = exact[author.name].get_word_frequency()
+                        else:
+                            sketch = author.get_emoji_frequency()
+                            exact_counts = exact[author.name].get_emoji_frequency()
+                        errors, author_kept = check_sketch(sketch, exact_counts, top)
+                        for error in errors:
+                            print(f"  {mode} k={capacity} {author.name} {kind}: {error}")
+                        broken += len(errors)
+                        kept += author_kept
+                        total += min(top, len(exact_counts))
+                        stored += len(sketch)
+                print(f"{mode:<8} k={capacity:<5} top-{top} kept {kept}/{total}, "
+                      f"{stored} terms stored")
+    if broken:
+        print(f"{broken} guarantees broken")
+        raise Exit(1)
+    print("All the guarantees hold.")
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,183 @@
+"""
+suite - benchmark of each stage of the analysis
+
+This script generates a synthetic chat with `benchmarks/generator.py`
+and times, separately, each stage of a run of the analysis:
+
+- `parse`: `WhatsappLexicalAnalyzer.process_file`;
+- `word_frequency`: `Author.get_word_frequency` of every author;
+- `emoji_frequency`: `Author.get_emoji_frequency` of every author
+  (the features of a message are extracted once, by the first stage
+  that needs them, so this one only adds up the counts);
+- `build_all`: `ConsoleBuilder.build_all`, without the images;
+- `word_clouds`: the rendering of the word clouds, without cache.
+
+Each stage is run `--repeat` times on a freshly parsed chat, and the
+minimum, median and maximum times are written to a JSON file with the
+options of the chat, the version of python and the git commit. Two of
+these files can be compared with `--compare`, to see regressions in
+the hot paths between versions.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/suite.py --output before.json` from the root
+  of the repository, and later `python benchmarks/suite.py --output
+  after.json --compare before.json`.
+- Use `--skip word_clouds` to leave out the slowest stages.
+"""
+
+from datetime import datetime
+import json
+import os
+import platform
+from statistics import median
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List, Optional
+
+from typer import run, Option
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analyzer import WhatsappLexicalAnalyzer
+from generator import generate_chat
+from images import save_word_clouds
+from models import Chat, set_tokenizer
+from results import ConsoleBuilder
+
+STAGES = ("parse", "word_frequency", "emoji_frequency", "build_all", "word_clouds")
+
+def get_commit() -> Optional[str]:
+    "Returns the current git commit of the repository, if there is one."
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+            capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse(filename: str) -> Chat:
+    "Parses a chat file into a Chat object."
+    analyzer = WhatsappLexicalAnalyzer()
+    analyzer.process_file(filename)
+    return analyzer.get_chat()
+
+def build_all(chat: Chat, words: int, emojis: int) -> None:
+    "Builds the console report of a chat, without the images."
+    builder = ConsoleBuilder()
+    builder.set_chat(chat)
+    builder.set_parameters({"words": words, "emojis": emojis, "images": False})
+    builder.build_all()
+
+def time_call(function: Callable[[], object]) -> float:
+    "Returns the seconds spent by a call."
+    start = perf_counter()
+    function()
+    return perf_counter() - start
+
+def run_stages(filename: str, repeat: int, skip: list[str]) -> dict[str, list[float]]:
+    """
+    Runs every stage `repeat` times and returns their times.
+    The frequency stages run on a freshly parsed chat, since
+    authors cache their frequencies after the first call.
+    """
+    times = {stage: list[float]() for stage in STAGES if stage not in skip}
+    for _ in range(repeat):
+        start = perf_counter()
+        chat = parse(filename)
+        if "parse" in times:
+            times["parse"].append(perf_counter() - start)
+        if "word_frequency" in times:
+            times["word_frequency"].append(time_call(
+                lambda: [author.get_word_frequency() for author in chat.authors]
+            ))
+        if "emoji_frequency" in times:
+            times["emoji_frequency"].append(time_call(
+                lambda: [author.get_emoji_frequency() for author in chat.authors]
+            ))
+        if "build_all" in times:
+            times["build_all"].append(time_call(lambda: build_all(chat, 30, 15)))
+        if "word_clouds" in times:
+            times["word_clouds"].append(time_call(lambda: save_word_clouds(chat.authors)))
+    return times
+
+def compare(results: dict, baseline: dict) -> None:
+    "Prints the ratio between the median times of two runs of the suite."
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('date')}):")
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        ratio = current["median"] / previous["median"] if previous["median"] else float("inf")
+        print(f"{stage:<16} {previous['median'] * 1000:10.1f} ms -> "
+              f"{current['median'] * 1000:10.1f} ms  x{ratio:.2f}")
+
+def main(
+    messages: int = Option(20000, "--messages", "-m", help="Number of messages."),
+    authors: int = Option(8, "--authors", "-a", help="Number of authors."),
+    multiline: float = Option(0.1, "--multiline", help="Ratio of multi-line messages."),
+    emojis: float = Option(0.3, "--emojis", help="Ratio of messages with emojis."),
+    english: float = Option(0.2, "--english", help="Ratio of messages in English."),
+    seed: int = Option(7, "--seed", help="Seed of the random generator."),
+    repeat: int = Option(3, "--repeat", "-r", help="Number of runs of each stage."),
+    fast_tokenizer: bool = Option(
+        False, "--fast-tokenizer", help="Split words with a regex instead of nltk."
+    ),
+    skip: Optional[List[str]] = Option(None, "--skip", help="Stage to leave out."),
+    output: str = Option(
+        "benchmark.json", "--output", "-o", help="File where the results are written."
+    ),
+    baseline: Optional[str] = Option(
+        None, "--compare", help="Results of a previous run to compare with."
+    )
+):
+    tokenizer = "fast" if fast_tokenizer else "nltk"
+    set_tokenizer(tokenizer)
+    options = {
+        "messages": messages, "authors": authors, "multiline": multiline,
+        "emojis": emojis, "english": english, "seed": seed, "tokenizer": tokenizer,
+    }
+    output = os.path.abspath(output)
+    with TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "chat.txt")
+        generate_chat(filename, messages, authors, multiline, emojis, english, seed=seed)
+        size = os.path.getsize(filename)
+        # The word clouds are saved in the results folder of the working directory.
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        try:
+            times = run_stages(filename, repeat, skip or [])
+        finally:
+            os.chdir(working_directory)
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "chat": {**options, "bytes": size},
+        "repeat": repeat,
+        "stages": {
+            stage: {"min": min(values), "median": median(values), "max": max(values)}
+            for stage, values in times.items()
+        },
+    }
+    with open(output, "w", encoding="utf8") as file:
+        json.dump(results, file, indent=2)
+        file.write("\n")
+
+    for stage, statistics in results["stages"].items():
+        print(f"{stage:<16} min {statistics['min'] * 1000:10.1f} ms  "
+              f"median {statistics['median'] * 1000:10.1f} ms")
+    print(f"Results written to {output}")
+    if baseline:
+        with open(baseline, encoding="utf8") as file:
+            compare(results, json.load(file))
+
+if __name__ == "__main__":
+    run(main)
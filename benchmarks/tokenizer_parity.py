@@ -0,0 +1,131 @@
+"""
+tokenizer_parity - compares the fast tokenizer with nltk
+
+This script first checks both tokenizers of the `models` module
+("nltk" and "fast") against fixed sentences (ellipses, quotes, inverted
+punctuation, contractions, URLs and paths...) whose words are known:
+the words of each sentence (the tokens made only of letters, in lower
+case, before removing the stop words) must be exactly the expected ones.
+
+Then, it analyzes the given chat exports with both tokenizers and
+reports how much their results differ:
+
+- the share of messages whose counted words are exactly the same,
+- the difference in the total number of counted words,
+- the overlap of the most common words of each author,
+- the time spent by each tokenizer.
+
+It exits with status 1 if a fixed sentence is not split as expected
+or if, for any author, the overlap of the most common words is below
+`--min-overlap`, so it can be run as a parity check.
+
+Author: Christopher Villamarín (xeland314)
+
+Usage:
+- Run `python benchmarks/tokenizer_parity.py [chat.txt other_chat.txt ...]`
+  from the root of the repository.
+"""
+
+import os
+import sys
+from collections import Counter
+from time import perf_counter
+from typing import List, Optional
+
+from typer import run, Argument, Exit, Option
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import WhatsappLexicalAnalyzer
+from models import Message, es_word_pattern, set_tokenizer, tokenize
+
+# Sentences and their words as split by nltk, which the fast tokenizer must match.
+PARITY_CASES = [
+    ("Hola...adiós, nos vemos mañana", ["hola", "adiós", "nos", "vemos", "mañana"]),
+    ("jaja...bueno,vale", ["jaja", "bueno", "vale"]),
+    ("'hola' dijo Ana", ["dijo", "ana"]),
+    ("«Comillas» y \"rectas\"", ["comillas", "y", "rectas"]),
+    ("¡¡¡Vamos!!! ¿Qué tal?", ["tal"]),
+    ("Llegamos al fin. Luego hablamos", ["llegamos", "al", "fin", "luego", "hablamos"]),
+    ("I cannot believe it, gonna cry",
+     ["i", "can", "not", "believe", "it", "gon", "na", "cry"]),
+    ("We don't know, she can't swim", ["we", "do", "know", "she", "ca", "swim"]),
+    ("mira https://ejemplo.com/foto-playa/dia.html ahora", ["mira", "https", "ahora"]),
+    ("revisa www.ejemplo.com/pagina?ver=todo luego", ["revisa", "luego"]),
+    ("el informe.pdf está en /home/ana/documentos", ["el", "está", "en"]),
+    ("fiesta🎉 casa 🎉playa", ["casa"]),
+    ("rock'n'roll y l'amour", ["y"]),
+]
+
+def get_words(text: str) -> list[str]:
+    "Returns the tokens of a text made only of letters, in lower case."
+    return [token.lower() for token in tokenize(text) if es_word_pattern.search(token)]
+
+def check_cases() -> list[str]:
+    "Returns the fixed sentences that a tokenizer does not split as expected."
+    errors = list[str]()
+    for tokenizer in ("nltk", "fast"):
+        set_tokenizer(tokenizer)
+        for text, expected in PARITY_CASES:
+            words = get_words(text)
+            if words != expected:
+                errors.append(f"{tokenizer}: {text!r} gives {words}, expected {expected}")
+    return errors
+
+def count_words(records: list, tokenizer: str) -> tuple[list[Counter], dict[str, Counter], float]:
+    """
+    Counts the words of every message with the given tokenizer.
+
+    Returns:
+        - The words of each message, the words of each author
+        and the seconds spent.
+    """
+    set_tokenizer(tokenizer)
+    per_message = []
+    per_author = dict[str, Counter]()
+    start = perf_counter()
+    for date_time, author, text in records:
+        words = Message(date_time, text).words
+        per_message.append(words)
+        per_author.setdefault(author, Counter()).update(words)
+    return per_message, per_author, perf_counter() - start
+
+def main(
+    files: Optional[List[str]] = Argument(None, help="Chat files to compare."),
+    top: int = Option(
+        30, "--top", "-t", help="Number of most common words compared per author."
+    ),
+    min_overlap: float = Option(
+        0.9, "--min-overlap", help="Minimum share of common words in each top list."
+    )
+):
+    errors = check_cases()
+    print(f"fixed sentences: {len(PARITY_CASES) * 2 - len(errors)}/{len(PARITY_CASES) * 2} ok")
+    for error in errors:
+        print(f"  {error}")
+    failed = bool(errors)
+    for filename in files or []:
+        records = list(WhatsappLexicalAnalyzer().iter_messages(filename))
+        nltk_messages, nltk_authors, nltk_time = count_words(records, "nltk")
+        fast_messages, fast_authors, fast_time = count_words(records, "fast")
+
+        same = sum(1 for a, b in zip(nltk_messages, fast_messages) if a == b)
+        nltk_total = sum(sum(words.values()) for words in nltk_messages)
+        fast_total = sum(sum(words.values()) for words in fast_messages)
+        print(f"{filename}: {len(records)} messages")
+        print(f"  identical messages: {same / max(len(records), 1):.2%}")
+        print(f"  counted words: nltk {nltk_total}, fast {fast_total}")
+        print(f"  time: nltk {nltk_time:.3f} s, fast {fast_time:.3f} s")
+
+        for author, nltk_words in nltk_authors.items():
+            nltk_top = {word for word, _ in nltk_words.most_common(top)}
+            fast_top = {word for word, _ in fast_authors[author].most_common(top)}
+            overlap = len(nltk_top & fast_top) / max(len(nltk_top), 1)
+            if overlap < min_overlap:
+                failed = True
+            print(f"  {author}: top {top} overlap {overlap:.2%}")
+    if failed:
+        raise Exit(code=1)
+
+if __name__ == "__main__":
+    run(main)
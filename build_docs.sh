@@ -4,4 +4,13 @@ pydoc-markdown -I . -m chat_analyzer --render-toc > docs/chat_analyzer.md
 pydoc-markdown -I . -m analyzer --render-toc > docs/analyzer.md
 pydoc-markdown -I . -m models --render-toc > docs/models.md
 pydoc-markdown -I . -m results --render-toc > docs/results.md
-pydoc-markdown -I . -m stopwords --render-toc > docs/stopwords.md
\ No newline at end of file
+pydoc-markdown -I . -m stopwords --render-toc > docs/stopwords.md
+pydoc-markdown -I . -m cache --render-toc > docs/cache.md
+pydoc-markdown -I . -m sentiment --render-toc > docs/sentiment.md
+pydoc-markdown -I . -m aggregation --render-toc > docs/aggregation.md
+pydoc-markdown -I . -m images --render-toc > docs/images.md
+pydoc-markdown -I . -m profiling --render-toc > docs/profiling.md
+pydoc-markdown -I . -m batch_analyzer --render-toc > docs/batch_analyzer.md
+pydoc-markdown -I . -m server --render-toc > docs/server.md
+pydoc-markdown -I . -m sketches --render-toc > docs/sketches.md
+pydoc-markdown -I . -m formats --render-toc > docs/formats.md
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+cache
+
+This module stores the aggregates of an analyzed chat on disk, so a
+chat export that did not change is not parsed and tokenized again.
+
+AnalysisCache saves each entry as a pickled ChatSummary, in a cache
+directory under a key made from a hash of the file contents and of
+the stop words configuration. If the file or the stop words change,
+the key changes too and the chat is analyzed again.
+
+IncrementalState saves, next to a chat file, the summary of the
+messages already analyzed and the byte offset where the last message
+starts. Exports of an ongoing chat only grow at the end, so the next
+run only needs to parse the file from that offset.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (hashlib, os, pickle, tempfile, typing),
+own modules (models, stopwords).
+"""
+
+from hashlib import blake2b
+import os
+import pickle
+from tempfile import mkstemp
+from typing import Any, Optional
+
+import models
+from models import ChatSummary
+from stopwords import get_stopwords, FIRST_LANGUAGE
+
+# Bumped whenever the attributes of the pickled summaries change.
+CACHE_VERSION = 3
+BLOCK_SIZE = 1024 * 1024
+FINGERPRINT_SIZE = 64 * 1024
+STATE_SUFFIX = ".state"
+
+def dump_atomically(value: Any, path: str) -> None:
+    """
+    Pickles a value into a file. It is written to a unique temporary
+    file in the same directory first, so concurrent or interrupted
+    runs never leave a truncated file behind.
+    """
+    descriptor, temporary_path = mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+def update_with_configuration(digest: blake2b, selection: str = "") -> None:
+    """
+    Adds the version of the cache format, the tokenizer, the
+    selection of messages analyzed and the stop words in use to a hash.
+    """
+    digest.update(f"{CACHE_VERSION}:{FIRST_LANGUAGE}:{models.tokenizer}:".encode("utf8"))
+    if selection:
+        digest.update(f"selection={selection}:".encode("utf8"))
+    digest.update("\n".join(sorted(get_stopwords())).encode("utf8"))
+
+class AnalysisCache:
+    """
+    AnalysisCache saves and loads ChatSummary objects
+    in a directory, indexed by the contents of the chat file.
+
+    Parameters:
+        - directory: str
+
+    Example:
+        ```python
+        cache = AnalysisCache(".cache")
+        key = cache.get_key("chat.txt")
+        summary = cache.load(key)
+        if summary is None:
+            summary = ...  # analyze the chat
+            cache.store(key, summary)
+        ```
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.__directory = directory
+
+    @property
+    def directory(self) -> str:
+        "Returns the directory where the entries are saved."
+        return self.__directory
+
+    def get_key(self, filename: str, selection: str = "") -> str:
+        """
+        Returns the key of a chat file: a hash of its contents,
+        the tokenizer and stop words in use, the selection of
+        messages analyzed (see analyzer.MessageFilter) and the
+        version of the cache format.
+        """
+        digest = blake2b(digest_size=20)
+        update_with_configuration(digest, selection)
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[ChatSummary]:
+        """
+        Returns the summary saved under the given key,
+        or None if there is no valid entry for it.
+        """
+        try:
+            with open(self.__get_path(key), "rb") as file:
+                summary = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if not isinstance(summary, ChatSummary):
+            return None
+        return summary
+
+    def store(self, key: str, summary: ChatSummary) -> None:
+        """
+        Saves a summary under the given key (see dump_atomically).
+        """
+        os.makedirs(self.__directory, exist_ok=True)
+        dump_atomically(summary, self.__get_path(key))
+
+    def __get_path(self, key: str) -> str:
+        return os.path.join(self.__directory, f"{key}.pickle")
+
+class IncrementalState:
+    """
+    IncrementalState saves the progress of the analysis of a chat
+    file in a sidecar file (`<filename>.state`).
+
+    The state holds the summary of every message before the last one
+    and the byte offset where the last message starts, since the
+    last message may still receive continuation lines. A fingerprint
+    of the analyzed bytes is used to detect that the file was
+    replaced instead of extended, in which case the state is ignored.
+
+    Parameters:
+        - filename: str
+        - selection: str, the selection of messages analyzed. A state
+        saved with another selection is ignored.
+    """
+
+    def __init__(self, filename: str, selection: str = "") -> None:
+        self.__filename = filename
+        self.__selection = selection
+        self.__path = f"{filename}{STATE_SUFFIX}"
+
+    @property
+    def path(self) -> str:
+        "Returns the path of the sidecar file."
+        return self.__path
+
+    def load(self) -> Optional[tuple[ChatSummary, int]]:
+        """
+        Returns the saved summary and the offset where the
+        analysis must continue, or None if there is no state
+        or it does not belong to the current file.
+        """
+        try:
+            with open(self.__path, "rb") as file:
+                state = pickle.load(file)
+            offset = state["offset"]
+            if os.path.getsize(self.__filename) < offset:
+                return None
+            if state["fingerprint"] != self.__get_fingerprint(offset):
+                return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError, TypeError):
+            return None
+        if not isinstance(state["summary"], ChatSummary):
+            return None
+        return state["summary"], offset
+
+    def store(self, summary: ChatSummary, offset: int) -> None:
+        """
+        Saves the summary of the messages before `offset`.
+        The summary is serialized immediately, so it can be
+        updated afterwards without changing the saved state.
+        """
+        state = {
+            "summary": summary,
+            "offset": offset,
+            "fingerprint": self.__get_fingerprint(offset),
+        }
+        dump_atomically(state, self.__path)
+
+    def __get_fingerprint(self, offset: int) -> str:
+        """
+        Returns a hash of the configuration, the offset, the
+        first bytes of the file and the bytes right before the
+        offset. It avoids reading the whole analyzed part again.
+        """
+        digest = blake2b(digest_size=20)
+        update_with_configuration(digest, self.__selection)
+        digest.update(str(offset).encode("utf8"))
+        with open(self.__filename, "rb") as file:
+            digest.update(file.read(min(offset, FINGERPRINT_SIZE)))
+            tail_start = max(0, offset - FINGERPRINT_SIZE)
+            file.seek(tail_start)
+            digest.update(file.read(offset - tail_start))
+        return digest.hexdigest()
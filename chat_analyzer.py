@@ -9,6 +9,7 @@ library. The `typer` library is used to define the command-line options.
 Author: Christopher Villamarín (xeland314)
 
 Dependencies:
+- datetime
 - os
 - typing
 - rich
@@ -22,19 +23,76 @@ Usage:
 
 Options:
 - `file`: Name or path of the chat log file. Required for analysis.
+  It can also be the `.zip` of an export, a `.gz` file or `-` to read
+  the standard input; they are decompressed while they are analyzed,
+  in a single process (`--jobs`, `--incremental` and `--mmap` are ignored).
 - `--install`, `-i`: Install NLTK dependencies and exit.
 - `--words`, `-w`: Number of words to show in the summary (default: 30).
 - `--emojis`, `-e`: Number of emojis to show in the summary (default: 15).
+- `--jobs`, `-j`: Number of processes used to analyze the chat (default: 1).
+  Large files are split at message boundaries and analyzed in parallel.
+- `--cache-dir`, `-c`: Directory where the analysis is cached. A later run
+  on the same unchanged file skips parsing and tokenization.
+- `--incremental`: Save the progress in `<file>.state` and, on the next run,
+  only analyze the messages appended to the file since then.
+- `--mmap`: Read the file with the memory-mapped reader, which finds the
+  messages with a bytes regex and only decodes authors and message bodies.
+- `--fast-tokenizer`: Split the messages into words with a single regex
+  instead of nltk `word_tokenize`. Much faster, with almost the same words.
+- `--sentiment`, `-s`: Show the mean and percentiles of the VADER sentiment
+  of each author and of the last days.
+- `--sentiment-jobs`: Number of processes used to score the sentiment
+  in batches (default: 0, in the main process).
+- `--global`, `-g`: Also show the most used words and emojis of the whole
+  chat and the words that are distinctive of each author.
+- `--no-images`: Do not generate the word cloud images.
+- `--image-jobs`: Number of processes used to render the word clouds
+  (default: 1). Unchanged word clouds are copied from a cache.
+- `--image-threads`: Render the word clouds in threads instead of processes.
+- `--min-messages`: Skip the word clouds of authors with fewer messages.
+- `--format`, `-f`: Format of the results: `console` (default), `jsonl`
+  (one JSON object per line) or `columnar` (numpy `.npz` columns).
+- `--output`, `-o`: File where the `jsonl` (default: standard output) or
+  `columnar` (default: `results/summary.npz`) results are written.
+- `--profile`: Print the time, CPU time, peak memory and number of items
+  of each stage of the analysis (parsing, tokenization, emojis, counting,
+  report, word clouds) to the standard error.
+- `--profile-output`: Also save the profile of `--profile` as JSON.
+- `--since`: Only analyze the messages sent on this day (YYYY-MM-DD) or later.
+- `--until`: Only analyze the messages sent on this day (YYYY-MM-DD) or before.
+  The file is not read past the messages of the next day.
+- `--author`, `-a`: Only analyze the messages of this author. It can be
+  repeated to select several authors.
+- `--approximate`: Count the words and emojis of each author in a
+  Space-Saving sketch of this many terms, in bounded memory. The counts
+  are upper bounds, and the report shows how much they can be off.
 
 Functions:
 - `file_callback(file: str) -> str`: A callback function for the `typer`
   library, used to check if a file exists before running the analysis.
+- `format_callback(output_format: str) -> str`: Checks the `--format` option.
 
 Example:
 ```bash
 # Analyze a chat log file and show summary
 python chat_analyzer.py chat.txt
 
+# Analyze the chat of a .zip export, or a chat read from the standard input
+python chat_analyzer.py "WhatsApp Chat with Ana.zip"
+zcat chat.txt.gz | python chat_analyzer.py - --no-images
+
+# Analyze a large chat log file using 8 processes
+python chat_analyzer.py chat.txt --jobs 8
+
+# Reuse the analysis of previous runs on the same file
+python chat_analyzer.py chat.txt --cache-dir .cache
+
+# Analyze the messages of two authors sent in the first quarter of 2023
+python chat_analyzer.py chat.txt --since 2023-01-01 --until 2023-03-31 -a Ana -a Luis
+
+# Write the aggregates of each author as JSON Lines
+python chat_analyzer.py chat.txt --format jsonl --output summary.jsonl --no-images
+
 # Install NLTK dependencies
 python chat_analyzer.py --install
 
@@ -43,31 +101,45 @@ python chat_analyzer.py --help
 ```
 """
 
+from datetime import datetime, timedelta
 from os.path import exists
-from typing import Optional
+from typing import List, Optional
 
-from nltk import download
 from typer import run, Option, Argument, BadParameter
 
-from analyzer import WhatsappStatisticalAnalyzer
+# The formats of results.FORMATS, repeated so that --help does not import results.
+FORMATS = ("console", "jsonl", "columnar")
 
 def file_callback(file: Optional[str]) -> str:
     """
     file_callback
         Checks if a file exists and throws an exception if not.
+        "-" (the standard input) is accepted as is.
 
     Raises:
         BadParameter: If the file does not exist.
     """
     if file is None:
         return
-    if not exists(file):
+    if file != "-" and not exists(file):
         raise BadParameter(f"El archivo {file} no existe.")
     return file
 
+def format_callback(output_format: str) -> str:
+    """
+    format_callback
+        Checks that the format of the results is known.
+
+    Raises:
+        BadParameter: If the format is not console, jsonl or columnar.
+    """
+    if output_format not in FORMATS:
+        raise BadParameter(f"El formato {output_format} no existe, usa uno de {FORMATS}.")
+    return output_format
+
 def main(
     file: Optional[str] = Argument(
-        None, help="File name o path.", callback=file_callback
+        None, help="File name o path (.txt, .zip, .gz, or - for stdin).", callback=file_callback
     ),
     install: bool = Option(
         False, "--install", "-i", help="Install nltk dependencies."
@@ -77,17 +149,106 @@ def main(
     ),
     emojis: int = Option(
         15, "--emojis", "-e", help="Number of emojis to show in the summary"
+    ),
+    jobs: int = Option(
+        1, "--jobs", "-j", help="Number of processes used to analyze the chat."
+    ),
+    cache_dir: Optional[str] = Option(
+        None, "--cache-dir", "-c", help="Directory where the analysis is cached."
+    ),
+    incremental: bool = Option(
+        False, "--incremental", help="Only analyze the messages appended since the last run."
+    ),
+    use_mmap: bool = Option(
+        False, "--mmap", help="Read the file with the memory-mapped reader."
+    ),
+    fast_tokenizer: bool = Option(
+        False, "--fast-tokenizer", help="Split words with a regex instead of nltk."
+    ),
+    sentiment: bool = Option(
+        False, "--sentiment", "-s", help="Show the sentiment of each author and day."
+    ),
+    sentiment_jobs: int = Option(
+        0, "--sentiment-jobs", help="Number of processes used to score the sentiment."
+    ),
+    chat_ranking: bool = Option(
+        False, "--global", "-g", help="Show the rankings of the whole chat."
+    ),
+    no_images: bool = Option(
+        False, "--no-images", help="Do not generate the word clouds."
+    ),
+    image_jobs: int = Option(
+        1, "--image-jobs", help="Number of processes used to render the word clouds."
+    ),
+    image_threads: bool = Option(
+        False, "--image-threads", help="Render the word clouds in threads."
+    ),
+    min_messages: int = Option(
+        0, "--min-messages", help="Minimum number of messages to render a word cloud."
+    ),
+    output_format: str = Option(
+        "console", "--format", "-f", help="console, jsonl or columnar.",
+        callback=format_callback
+    ),
+    output: Optional[str] = Option(
+        None, "--output", "-o", help="File where the jsonl or columnar results are written."
+    ),
+    profile: bool = Option(
+        False, "--profile", help="Print the time and memory of each stage."
+    ),
+    profile_output: Optional[str] = Option(
+        None, "--profile-output", help="JSON file where the profile is saved."
+    ),
+    since: Optional[datetime] = Option(
+        None, "--since", formats=["%Y-%m-%d"], help="First day analyzed."
+    ),
+    until: Optional[datetime] = Option(
+        None, "--until", formats=["%Y-%m-%d"], help="Last day analyzed."
+    ),
+    authors: Optional[List[str]] = Option(
+        None, "--author", "-a", help="Only analyze the messages of this author."
+    ),
+    approximate: Optional[int] = Option(
+        None, "--approximate", min=1,
+        help="Count words and emojis approximately, keeping this many terms per author."
     )
 ):
+    # nltk and the analysis stack are imported here, so `--help`
+    # and `--install` do not pay for loading them.
     if install and file is None:
+        from nltk import download
+
         download("punkt")
         download("stopwords")
         download("wordnet")
         download("vader_lexicon")
         return
 
-    analyzer = WhatsappStatisticalAnalyzer(file, words, emojis)
+    from analyzer import MessageFilter, WhatsappStatisticalAnalyzer
+    from profiling import Profiler
+
+    profiler = Profiler() if profile or profile_output else None
+
+    # --until includes the whole day, the filter excludes its end.
+    message_filter = MessageFilter(
+        since, until + timedelta(days=1) if until else None, authors
+    )
+    analyzer = WhatsappStatisticalAnalyzer(
+        file, words, emojis, jobs, cache_dir, incremental,
+        backend="mmap" if use_mmap else "text",
+        tokenizer="fast" if fast_tokenizer else "nltk",
+        sentiment=sentiment, sentiment_jobs=sentiment_jobs,
+        message_filter=message_filter, chat_ranking=chat_ranking,
+        images=not no_images, image_jobs=image_jobs,
+        image_threads=image_threads, min_messages=min_messages,
+        output_format=output_format, output=output, profiler=profiler,
+        approximate=approximate
+    )
     analyzer.print_summary()
+    if profiler is not None:
+        profiler.print_table()
+        if profile_output:
+            profiler.dump(profile_output)
 
 if __name__ == "__main__":
     run(main)
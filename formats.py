@@ -0,0 +1,279 @@
+"""
+formats
+
+This module describes the layouts of the message headers of the
+WhatsApp exports, and detects the layout of a chat from its first
+lines.
+
+Android exports start each message with `d/m/yy, H:MM - Author:`,
+and iOS exports with `[dd/mm/yyyy, HH:MM:SS] Author:`. Depending on
+the locale of the phone, the year has two or four digits, the day
+comes first or after the month, and the clock has 24 hours or 12
+hours with an AM/PM suffix (`PM`, `p. m.`...).
+
+detect_format samples the first lines of a chat once and returns a
+ChatFormat: the compiled patterns of exactly that layout and a
+converter of its timestamps into datetimes, which splits the fields
+instead of calling `strptime`. The rest of the file is parsed with
+that format only, so no line pays for guessing its layout.
+
+When no date of the sample tells the day from the month (all of
+them are up to 12), detect_file_format searches the rest of the file
+for one with a bytes regex; without it, the day comes first. For the
+chats read as streams (compressed files or the standard input),
+detect_stream_format reads ahead the same amount of lines and keeps
+them, so they are still parsed.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (datetime, itertools, re, typing).
+"""
+
+from datetime import datetime
+from itertools import chain, islice
+import re
+from typing import Iterable, Iterator, Optional
+
+LAYOUTS = ("android", "ios")
+SAMPLE_LINES = 200
+SAMPLE_BYTES = 64 * 1024
+SCAN_BYTES = 8 * 1024 * 1024
+BOM = b"\xef\xbb\xbf"
+ABOVE_12 = r"(?:1[3-9]|2\d|3[01])"
+
+# The marks and spaces are Python escapes, not regex escapes, so the
+# patterns can also be encoded as UTF-8 for the bytes regexes.
+LEFT_TO_RIGHT_MARK = "(?:\u200e)?"
+MERIDIEM = "(?: |\u00a0|\u202f)?[AaPp]\\.?(?: |\u00a0|\u202f)?[Mm]\\.?"
+
+# Broad patterns of the headers of each layout, only used to detect the format.
+PROBES = {
+    "android": re.compile(
+        rf"(?P<date>\d{{1,2}}/\d{{1,2}}/\d{{2,4}}),? "
+        rf"(?P<time>\d{{1,2}}:\d{{2}}(?::\d{{2}})?)(?P<meridiem>{MERIDIEM})? - [^:]+:"
+    ),
+    "ios": re.compile(
+        rf"{LEFT_TO_RIGHT_MARK}\[(?P<date>\d{{1,2}}/\d{{1,2}}/\d{{2,4}}),? "
+        rf"(?P<time>\d{{1,2}}:\d{{2}}(?::\d{{2}})?)(?P<meridiem>{MERIDIEM})?\] [^:]+:"
+    ),
+}
+
+class ChatFormat:
+    """
+    The layout of the message headers of a chat export.
+
+    Attributes:
+        - line_pattern: matches a line that starts with a header, with
+        the groups date, time, author (None for system notifications)
+        and message.
+        - first_header_bytes_pattern and header_bytes_pattern: the same
+        header in a bytes buffer, at its start or after a newline. The
+        empty group `start` marks where the header line starts.
+
+    Parameters:
+        - layout: "android" (default) or "ios"
+        - day_first: bool, whether the day comes before the month
+        - long_year: bool, whether the year has four digits
+        - seconds: bool, whether the time has seconds
+        - clock12: bool, whether the time has an AM/PM suffix
+    """
+
+    def __init__(
+        self, layout: str = "android", day_first: bool = True,
+        long_year: bool = False, seconds: bool = False, clock12: bool = False
+    ) -> None:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {layout}, use one of {LAYOUTS}.")
+        self.__settings = (layout, day_first, long_year, seconds, clock12)
+        self.__day_first = day_first
+        self.__clock12 = clock12
+
+        date = r"\d{1,2}/\d{1,2}/" + (r"\d{4}" if long_year else r"\d{2}")
+        time = r"\d{1,2}:\d{2}" + (r":\d{2}" if seconds else "") + (MERIDIEM if clock12 else "")
+        if layout == "android":
+            header, separator = rf"(?P<date>{date}),? (?P<time>{time})", " - "
+        else:
+            header, separator = rf"{LEFT_TO_RIGHT_MARK}\[(?P<date>{date}),? (?P<time>{time})\]", " "
+        self.line_pattern = re.compile(
+            rf"{header}(?:{separator}(?:(?P<author>.+?)\s?:(?:\s?(?P<message>.+)|\s*))?)?"
+        )
+        header_bytes_source = (
+            rf"(?P<start>){header}(?:{separator}(?:(?P<author>[^\r\n]+?)[ \t\f\v]?:"
+            r"(?:[ \t\f\v]?(?P<message>[^\r\n]+)|[ \t\f\v]*))?)?[^\n]*"
+        ).encode("utf8")
+        self.first_header_bytes_pattern = re.compile(header_bytes_source)
+        self.header_bytes_pattern = re.compile(rb"\n" + header_bytes_source)
+
+    @property
+    def name(self) -> str:
+        "Returns a short description of the format, like `android d/m/yy H:MM`."
+        layout, day_first, long_year, seconds, clock12 = self.__settings
+        year = "yyyy" if long_year else "yy"
+        date = f"d/m/{year}" if day_first else f"m/d/{year}"
+        time = ("h" if clock12 else "H") + ":MM" + (":SS" if seconds else "") + (" AM" if clock12 else "")
+        return f"{layout} {date} {time}"
+
+    def to_datetime(self, date_str: str, time_str: str) -> datetime:
+        """
+        Converts the date and time of a header into a datetime.
+        Two-digit years follow the pivot of `strptime`: 69 to 99
+        are 1969 to 1999, and 00 to 68 are 2000 to 2068.
+
+        Raises:
+            ValueError: If the date or the time does not exist.
+        """
+        first, second, year = date_str.split("/")
+        year = int(year)
+        if year < 100:
+            year += 1900 if year >= 69 else 2000
+        day, month = (first, second) if self.__day_first else (second, first)
+        # The minutes and seconds may be followed by the AM/PM suffix.
+        hour, minute, *rest = time_str.split(":")
+        hour = int(hour)
+        if self.__clock12:
+            hour %= 12
+            if "p" in time_str or "P" in time_str:
+                hour += 12
+        return datetime(
+            year, int(month), int(day), hour, int(minute[:2]), int(rest[0][:2]) if rest else 0
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ChatFormat) and self.__settings == other.__settings
+
+    def __hash__(self) -> int:
+        return hash(self.__settings)
+
+    def __repr__(self) -> str:
+        return f"<ChatFormat {self.name}>"
+
+ANDROID = ChatFormat()
+
+def detect_format(lines: Iterable[str], day_first: Optional[bool] = None) -> ChatFormat:
+    """
+    Returns the format of a chat from a sample of its first lines:
+    the layout whose headers match the most lines and, from their
+    timestamps, the number of digits of the year, the order of the
+    day and the month, the seconds and the clock. Without headers,
+    it is ANDROID. If no date of the sample tells the day from the
+    month, `day_first` is used (the day first if it is None).
+    """
+    layout, found = sample_headers(lines)
+    if not found:
+        return ANDROID
+    order = get_day_order(found)
+    return ChatFormat(
+        layout, order if order is not None else day_first is not False,
+        long_year=any(len(match.group("date").rsplit("/", 1)[1]) == 4 for match in found),
+        seconds=any(match.group("time").count(":") == 2 for match in found),
+        clock12=any(match.group("meridiem") for match in found)
+    )
+
+def sample_headers(lines: Iterable[str]) -> tuple[str, list[re.Match]]:
+    "Returns the layout whose headers match the most lines of a sample, and their matches."
+    matches = {layout: list[re.Match]() for layout in LAYOUTS}
+    for line in islice(lines, SAMPLE_LINES):
+        for layout, probe in PROBES.items():
+            match = probe.match(line)
+            if match is not None:
+                matches[layout].append(match)
+                break
+    layout = max(LAYOUTS, key=lambda layout: len(matches[layout]))
+    return layout, matches[layout]
+
+def get_day_order(headers: list[re.Match]) -> Optional[bool]:
+    """
+    Returns True if the day comes first in the dates of some headers,
+    False if the month does, or None if every field is up to 12.
+    """
+    for match in headers:
+        first, second, _ = match.group("date").split("/")
+        if int(first) > 12:
+            return True
+        if int(second) > 12:
+            return False
+    return None
+
+def get_day_order_sources(layout: str) -> tuple[str, str]:
+    """
+    Returns the sources of the patterns of a header whose day, or
+    whose month, is above 12, in that order.
+    """
+    prefix = rf"{LEFT_TO_RIGHT_MARK}\[" if layout == "ios" else ""
+    time = r",? \d{1,2}:\d{2}"
+    return (
+        rf"{prefix}{ABOVE_12}/\d{{1,2}}/\d{{2,4}}{time}",
+        rf"{prefix}\d{{1,2}}/{ABOVE_12}/\d{{2,4}}{time}",
+    )
+
+def scan_day_order(filename: str, layout: str) -> Optional[bool]:
+    """
+    Searches the first SCAN_BYTES bytes of a chat file for a header
+    whose date tells the day from the month. Returns True if the day
+    comes first, False if the month does, or None if none was found.
+    """
+    day_first, month_first = (
+        re.compile(b"\n" + source.encode("utf8")) for source in get_day_order_sources(layout)
+    )
+    with open(filename, "rb") as file:
+        data = b"\n" + file.read(SCAN_BYTES)
+    day_match, month_match = day_first.search(data), month_first.search(data)
+    if day_match is None or month_match is None:
+        return None if day_match is month_match else day_match is not None
+    return day_match.start() < month_match.start()
+
+def detect_file_format(filename: str) -> ChatFormat:
+    """
+    Returns the format of a chat file, detected from its first lines
+    and, if they do not tell the day from the month, from a scan of
+    the rest of the file.
+    """
+    with open(filename, "rb") as file:
+        data = file.read(SAMPLE_BYTES)
+    if data.startswith(BOM):
+        data = data[len(BOM):]
+    lines = data.decode("utf8", errors="replace").splitlines()
+    layout, found = sample_headers(lines)
+    day_first = None
+    if found and get_day_order(found) is None:
+        day_first = scan_day_order(filename, layout)
+    return detect_format(lines, day_first)
+
+def read_day_order(
+    sample: list[str], lines: Iterator[str], layout: str
+) -> tuple[Optional[bool], list[str]]:
+    """
+    Reads the sample and then the rest of a chat stream, up to
+    SCAN_BYTES bytes, until a header whose date tells the day from the
+    month. Returns True if the day comes first, False if the month
+    does, or None if none was found, and the lines read beyond the
+    sample.
+    """
+    day_first, month_first = (re.compile(source) for source in get_day_order_sources(layout))
+    read = list[str]()
+    size = 0
+    for index, line in enumerate(chain(sample, lines)):
+        if index >= len(sample):
+            read.append(line)
+        if day_first.match(line):
+            return True, read
+        if month_first.match(line):
+            return False, read
+        size += len(line.encode("utf8"))
+        if size >= SCAN_BYTES:
+            break
+    return None, read
+
+def detect_stream_format(lines: Iterable[str]) -> tuple[ChatFormat, Iterator[str]]:
+    """
+    Returns the format of a chat read as a stream of lines, detected
+    like detect_file_format, and an iterator over every line of the
+    stream, including the ones read ahead to detect it.
+    """
+    lines = iter(lines)
+    sample = list(islice(lines, SAMPLE_LINES))
+    layout, found = sample_headers(sample)
+    day_first, read = None, list[str]()
+    if found and get_day_order(found) is None:
+        day_first, read = read_day_order(sample, lines, layout)
+    return detect_format(sample, day_first), chain(sample, read, lines)
@@ -0,0 +1,151 @@
+"""
+images
+
+This module renders the word clouds of the authors of a chat
+and saves them in the results folder.
+
+The rendered images are cached by a hash of the word frequencies
+and of the rendering settings, so an author whose words did not
+change since a previous run is copied from the cache instead of
+being rendered again. The word clouds of several authors can be
+rendered in a pool of processes or threads, and authors with the
+same frequencies share one rendering.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (concurrent, datetime, hashlib,
+os, shutil, tempfile, typing), downloaded packages (wordcloud).
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from hashlib import blake2b
+import os
+import shutil
+from tempfile import mkstemp
+from typing import Callable, Iterable, Mapping, Optional
+
+RESULTS_DIRECTORY = "results"
+IMAGE_CACHE_DIRECTORY = os.path.join(RESULTS_DIRECTORY, ".cache")
+WIDTH = 800
+HEIGHT = 400
+MAX_WORDS = 2000
+
+def get_image_key(frequencies: Mapping[str, int]) -> str:
+    "Returns a hash of the word frequencies and of the rendering settings."
+    digest = blake2b(digest_size=20)
+    digest.update(f"{WIDTH}x{HEIGHT}:{MAX_WORDS}:".encode("utf8"))
+    for word, count in sorted(frequencies.items()):
+        digest.update(f"{word}\t{count}\n".encode("utf8"))
+    return digest.hexdigest()
+
+def render_word_cloud(frequencies: Mapping[str, int], path: str) -> None:
+    "Renders a wordcloud image from the given word frequencies into a file."
+    # wordcloud pulls numpy, PIL and matplotlib, so it is only imported here.
+    from wordcloud import WordCloud
+
+    word_cloud = WordCloud(
+        width=WIDTH, height=HEIGHT,
+        background_color='white',
+        max_words=MAX_WORDS
+    )
+    word_cloud.generate_from_frequencies(dict(frequencies))
+    word_cloud.to_file(path)
+
+def get_result_path(name: str) -> str:
+    "Returns the path of the word cloud of an author in the results folder."
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+    date_time = datetime.now().strftime("%m-%d-%Y_%H-%M-%S")
+    return os.path.join(RESULTS_DIRECTORY, f"{name}_{date_time}_word_cloud.jpg")
+
+def cache_word_cloud(
+    frequencies: Mapping[str, int], cache_dir: str, key: Optional[str] = None
+) -> str:
+    """
+    Renders the word cloud of some word frequencies into the cache
+    directory, unless it is already there, and returns its path.
+    """
+    cached_path = os.path.join(cache_dir, f"{key or get_image_key(frequencies)}.jpg")
+    if not os.path.exists(cached_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Rendered under a unique temporary name, so a concurrent or
+        # interrupted run never leaves a partial image in the cache.
+        descriptor, temporary_path = mkstemp(suffix=".tmp.jpg", dir=cache_dir)
+        os.close(descriptor)
+        try:
+            render_word_cloud(frequencies, temporary_path)
+            os.replace(temporary_path, cached_path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+    return cached_path
+
+def save_word_cloud(
+    name: str, frequencies: Mapping[str, int], cache_dir: Optional[str] = None
+) -> str:
+    """
+    Generates a wordcloud image from the given word frequencies
+    and saves it in the results folder. With a cache_dir, the image
+    is rendered once per distinct frequencies and copied from there.
+
+    Returns:
+        - The path of the saved image.
+    """
+    path = get_result_path(name)
+    if cache_dir is None:
+        render_word_cloud(frequencies, path)
+    else:
+        shutil.copyfile(cache_word_cloud(frequencies, cache_dir), path)
+    return path
+
+def run_tasks(function: Callable, tasks: list[tuple], jobs: int, threads: bool) -> list:
+    """
+    Calls a function with the arguments of each task, in a pool of
+    `jobs` processes (or threads) if there are several, and returns
+    the results in the order of the tasks.
+    """
+    if jobs <= 1 or len(tasks) <= 1:
+        return [function(*arguments) for arguments in tasks]
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=min(jobs, len(tasks))) as executor:
+        futures = [executor.submit(function, *arguments) for arguments in tasks]
+        return [future.result() for future in futures]
+
+def save_word_clouds(
+    authors: Iterable, jobs: int = 1, threads: bool = False,
+    min_messages: int = 0, cache_dir: Optional[str] = None
+) -> list[str]:
+    """
+    Saves the word clouds of several authors (Author or AuthorSummary
+    objects). Authors with fewer than `min_messages` messages are
+    skipped. With jobs > 1, the images are rendered in a pool of
+    `jobs` processes, or threads if `threads` is True. With a
+    cache_dir, authors with the same word frequencies share one
+    image, which is rendered once.
+
+    Returns:
+        - The paths of the saved images, in the order of the authors.
+    """
+    tasks = [
+        (author.name, dict(author.get_word_frequency()))
+        for author in authors if author.messages >= min_messages
+    ]
+    if cache_dir is None:
+        paths = [get_result_path(name) for name, _ in tasks]
+        run_tasks(
+            render_word_cloud, [(words, path) for (_, words), path in zip(tasks, paths)],
+            jobs, threads
+        )
+        return paths
+    keys = [get_image_key(words) for _, words in tasks]
+    images = {key: words for key, (_, words) in zip(keys, tasks)}
+    cached_paths = dict(zip(images, run_tasks(
+        cache_word_cloud, [(words, cache_dir, key) for key, words in images.items()],
+        jobs, threads
+    )))
+    paths = list[str]()
+    for (name, _), key in zip(tasks, keys):
+        path = get_result_path(name)
+        shutil.copyfile(cached_paths[key], path)
+        paths.append(path)
+    return paths
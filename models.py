@@ -4,36 +4,120 @@ models
 Author: Christopher Villamarín (xeland314)
 
 Dependencies:
+- array
+- bisect
 - collections
 - datetime
 - itertools
-- os
 - re
 - emoji
 - nltk
-- wordcloud
+- images (own module)
+- sentiment (own module)
+- sketches (own module)
 - stopwords (own module)
 """
 
+from array import array
+from bisect import bisect_left, insort
 from collections import Counter
 from datetime import datetime, date
 from itertools import chain
-import os
 import re
+from typing import Optional, Union
 
 from emoji import distinct_emoji_list
 from nltk.probability import FreqDist
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from nltk.tokenize import word_tokenize
-from wordcloud import WordCloud
 
-from stopwords import STOPWORDS, FIRST_LANGUAGE
+from images import save_word_cloud
+from sentiment import SentimentSummary, get_sentiment_analyzer
+from sketches import SpaceSaving
+from stopwords import get_stopwords, FIRST_LANGUAGE
 
 es_word_pattern = re.compile(r"^[A-Za-záéíóúÁÉÍÓÚüÜñÑ]+$")
 multimedia_pattern = re.compile(r"\<Multimedia omitido\>")
 hahaha_pattern = re.compile(r"(?:[ahjk]?(ja|je|ji|jo|js|ha|ka|xa)+[hjksx]?)")
+# The fast tokenizer only yields the words that nltk would also leave
+# alone. nltk splits these characters from the words next to them; any
+# other one (letters, digits, "/", "-", "'", "¡", "¿", "…", emojis...)
+# keeps the word glued to it, so it is not counted. A single dot also
+# glues words ("archivo.txt", "www.sitio.com"), but ellipses and the
+# final dot do not. The "n't" and "'s"-like suffixes, and the
+# contractions of nltk ("cannot", "gonna"...), are split like nltk does.
+FAST_SPLIT = r"""!"#$%&()*,.:;<>?@\[\]`{}«»“”‘’"""
+FAST_LETTERS = "A-Za-záéíóúÁÉÍÓÚüÜñÑ"
+FAST_SUFFIX_END = rf"(?:[ {FAST_SPLIT}]|\s*\Z)"
+FAST_WORD_END = \
+    rf"(?![^\s'{FAST_SPLIT}]|\.\w|'(?!(?:\w|ll|re|ve|LL|RE|VE){FAST_SUFFIX_END})\w)"
+fast_word_pattern = \
+    re.compile(
+        rf"(?<![^\s{FAST_SPLIT}])(?<!(?<!\.)\.)(?:[{FAST_LETTERS}]+?(?=n't(?:'|{FAST_SUFFIX_END}))"
+        rf"|(?i:can(?=not{FAST_WORD_END})|gim(?=me{FAST_WORD_END})|gon(?=na{FAST_WORD_END})"
+        rf"|got(?=ta{FAST_WORD_END})|lem(?=me{FAST_WORD_END})|wan(?=na{FAST_WORD_END}))"
+        rf"|[{FAST_LETTERS}]+{FAST_WORD_END})"
+        rf"|(?i:(?<=\bcan)not|(?<=\bgim)me|(?<=\bgon)na|(?<=\bgot)ta|(?<=\blem)me"
+        rf"|(?<=\bwan)na){FAST_WORD_END}"
+    )
+
+TOKENIZERS = ("nltk", "fast")
+tokenizer = "nltk"
+# The memo of is_countable_word is cleared when it is full, so its
+# memory does not grow with the vocabulary of the chats analyzed.
+COUNTABLE_WORDS_SIZE = 1 << 16
+countable_words = dict[str, bool]()
+
+def to_seconds(date_time: datetime) -> float:
+    "Returns the seconds elapsed from 0001-01-01 to a naive datetime."
+    return (date_time.toordinal() * 86400 + date_time.hour * 3600
+            + date_time.minute * 60 + date_time.second + date_time.microsecond / 1e6)
+
+def set_tokenizer(name: str) -> None:
+    """
+    Selects how messages are split into words:
+        - "nltk" (default): nltk word_tokenize, with the Punkt
+        sentence splitter and the Treebank regexes.
+        - "fast": a single regex that only yields alphabetic
+        Spanish/English words. It is much faster, and the
+        counted words are almost always the same.
+    """
+    global tokenizer
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer {name}, use one of {TOKENIZERS}.")
+    tokenizer = name
 
-sentiment_analyzer = SentimentIntensityAnalyzer()
+def is_countable_word(word: str) -> bool:
+    """
+    Determines if a lowercase token must be counted as a word:
+    it is not a stop word, it is not a laugh and it only has
+    letters. The answer is memoized for the last distinct tokens
+    (up to COUNTABLE_WORDS_SIZE), so the stop word lookup and both
+    regexes run about once per frequent word instead of once per
+    occurrence.
+    """
+    countable = countable_words.get(word)
+    if countable is None:
+        countable = not (word in get_stopwords() or hahaha_pattern.search(word)) \
+            and es_word_pattern.search(word) is not None
+        if len(countable_words) >= COUNTABLE_WORDS_SIZE:
+            countable_words.clear()
+        countable_words[word] = countable
+    return countable
+
+def tokenize(text: str) -> tuple[str, ...]:
+    "Splits a text into tokens with the selected tokenizer."
+    if tokenizer == "fast":
+        return tuple(fast_word_pattern.findall(text))
+    return tuple(word_tokenize(text, language=FIRST_LANGUAGE))
+
+def filter_words(tokens: tuple[str, ...]) -> Counter:
+    "Counts the tokens that are countable words, in lower case."
+    filtered_words = Counter()
+    for word in tokens:
+        word = word.lower()
+        if is_countable_word(word):
+            filtered_words[word] += 1
+    return filtered_words
 
 class Message:
 
@@ -48,11 +132,27 @@ class Message:
     Returns:
         - emojis: Counter
         - words: Counter
+
+    Messages use __slots__ instead of a __dict__, since a chat
+    can hold millions of them.
+
+    The tokens, words and emojis are extracted once by
+    extract_features() and stored, so every statistic
+    reads the same results instead of tokenizing again.
     """
 
+    __slots__ = (
+        "__date_time", "__message", "__tokens",
+        "__words", "__emojis", "__sentiment"
+    )
+
     def __init__(self, date_time: datetime, message: str) -> None:
         self.__date_time = date_time
         self.__message = message
+        self.__tokens = None
+        self.__words = None
+        self.__emojis = None
+        self.__sentiment = None
 
     @property
     def date_time(self) -> datetime:
@@ -62,8 +162,8 @@ class Message:
     @property
     def emojis(self) -> Counter:
         "Returns a list with the unique emojis present in the message."
-        emojis = distinct_emoji_list(self.__message)
-        return Counter(emojis)
+        self.extract_features()
+        return self.__emojis
 
     @property
     def is_multimedia(self) -> bool:
@@ -75,6 +175,12 @@ class Message:
         "Returns the message content."
         return self.__message
 
+    @property
+    def tokens(self) -> tuple[str, ...]:
+        "Returns the tokens of the message, as given by the selected tokenizer."
+        self.extract_features()
+        return self.__tokens
+
     @property
     def words(self) -> Counter:
         """
@@ -82,21 +188,39 @@ class Message:
         filtered to remove unnecessary words like STOPWORDS, specific
         regex patterns, and emojis.
         """
-        if self.is_multimedia:
-            return Counter()
-        words = word_tokenize(self.__message, language=FIRST_LANGUAGE)
-        filtered_words = Counter()
-        for word in words:
-            word = word.lower()
-            if word in STOPWORDS or hahaha_pattern.search(word):
-                continue
-            if es_word_pattern.search(word):
-                filtered_words[word] += 1
-        return filtered_words
+        self.extract_features()
+        return self.__words
+
+    def extract_features(self, profiler=None) -> None:
+        """
+        Tokenizes the message and stores its tokens, its filtered
+        words and its emojis. It does nothing if the features
+        were already extracted.
+
+        With a profiler (see profiling.Profiler), the time of each
+        step and the number of items found are added to the
+        "tokenize", "emojis" and "words" stages.
+        """
+        if self.__tokens is not None:
+            return
+        if profiler is None:
+            self.__tokens = tokenize(self.__message)
+            self.__emojis = Counter(distinct_emoji_list(self.__message))
+            self.__words = Counter() if self.is_multimedia else filter_words(self.__tokens)
+            return
+        with profiler.timer("tokenize"):
+            self.__tokens = tokenize(self.__message)
+        with profiler.timer("emojis"):
+            self.__emojis = Counter(distinct_emoji_list(self.__message))
+        with profiler.timer("words"):
+            self.__words = Counter() if self.is_multimedia else filter_words(self.__tokens)
+        profiler.count("tokenize", tokens=len(self.__tokens))
+        profiler.count("emojis", emojis=sum(self.__emojis.values()))
+        profiler.count("words", words=sum(self.__words.values()))
 
     def get_word_count(self) -> int:
         "Returns the number of words in the message."
-        return len(word_tokenize(self.__message))
+        return len(self.tokens)
 
     def get_character_count(self) -> int:
         "Returns the number of characters in the message."
@@ -107,8 +231,10 @@ class Message:
         Returns a float between -1 and 1 indicating
         the overall sentiment of the message.
         """
-        sentiment_scores = sentiment_analyzer.polarity_scores(self.__message)
-        return sentiment_scores["compound"]
+        if self.__sentiment is None:
+            sentiment_scores = get_sentiment_analyzer().polarity_scores(self.__message)
+            self.__sentiment = sentiment_scores["compound"]
+        return self.__sentiment
 
     def __len__(self) -> int:
         "Returns the number of characters in the message."
@@ -124,6 +250,11 @@ class Author:
     Attributes:
         - name : str
         - messages : dict
+
+    The word and emoji frequencies are a cache that is updated in
+    place: save_message marks the new message as pending, and the
+    next call to get_word_frequency or get_emoji_frequency only adds
+    the pending messages to the totals.
     """
 
     def __init__(self, name: str) -> None:
@@ -131,6 +262,7 @@ class Author:
         self.__messages_count = 0
         self.__emojis = FreqDist()
         self.__words = FreqDist()
+        self.__pending = list[Message]()
         self.__messages = dict[date, list[Message]]()
 
     @property
@@ -167,40 +299,39 @@ class Author:
         Returns a dictionary of all the words that
         the author has used and their frequency.
         """
-        if self.__words.B() == 0:
-            for message_list in self.__messages.values():
-                for message in message_list:
-                    self.__words += message.words
+        self.__update_frequencies()
         return self.__words
 
     def get_emoji_frequency(self) -> FreqDist:
         """
-        Returns a dictionary of all the words that
-         the author has used and their frequency.
+        Returns a dictionary of all the emojis that
+        the author has used and their frequency.
         """
-        if self.__emojis.B() == 0:
-            for message_list in self.__messages.values():
-                for message in message_list:
-                    self.__emojis += message.emojis
+        self.__update_frequencies()
         return self.__emojis
 
+    def invalidate_frequencies(self) -> None:
+        """
+        Discards the cached word and emoji frequencies, so they
+        are counted again from all the messages on the next call.
+        """
+        self.__words.clear()
+        self.__emojis.clear()
+        self.__pending = self.get_message_list()
+
+    def __update_frequencies(self) -> None:
+        "Adds the messages saved since the last update to the frequencies."
+        for message in self.__pending:
+            self.__words.update(message.words)
+            self.__emojis.update(message.emojis)
+        self.__pending.clear()
+
     def generate_word_cloud(self) -> None:
         """
         Generates a wordcloud image from the words that
         the author wrote in the chat.
         """
-        words = dict(self.get_word_frequency())
-        word_cloud = WordCloud(
-            width=800, height=400,
-            background_color='white',
-            max_words=2000
-        )
-        word_cloud.generate_from_frequencies(words)
-        if not os.path.isdir("results"):
-            os.mkdir("results")
-        now = datetime.now()
-        date_time = now.strftime("%m-%d-%Y_%H-%M-%S")
-        word_cloud.to_file(f"results/{self.name}_{date_time}_word_cloud.jpg")
+        save_word_cloud(self.name, self.get_word_frequency())
 
     def get_average_words_per_message(self) -> float:
         "Calculates the average of words per message."
@@ -225,6 +356,7 @@ class Author:
             self.__messages[day] = []
         self.__messages[day].append(new_message)
         self.__messages_count += 1
+        self.__pending.append(new_message)
 
     def __str__(self) -> str:
         return f"{self.__name}: {self.__messages_count} messages, {self.active_days} active days"
@@ -232,21 +364,118 @@ class Author:
     def __repr__(self) -> str:
         return f"<Author '{self.__name}' with {self.__messages_count} messages sent>"
 
+class TimeIndex:
+    """
+    A class that indexes the messages of a chat by time. It is
+    updated as each message is registered, so time slices of the
+    chat can be answered without walking every message again.
+
+    It keeps:
+        - the timestamps of each author, sorted, in a compact array
+        of seconds, so the messages in a range are counted with a
+        binary search;
+        - histograms by hour of the day, by weekday, by
+        weekday and hour, and by month, per author and for the
+        whole chat.
+    """
+
+    def __init__(self) -> None:
+        self.__timestamps = dict[str, array]()
+        self.__hours = dict[Optional[str], list[int]]()
+        self.__weekdays = dict[Optional[str], list[int]]()
+        self.__heatmaps = dict[Optional[str], list[int]]()
+        self.__months = dict[Optional[str], Counter]()
+
+    @property
+    def authors(self) -> list[str]:
+        "Returns the names of the indexed authors."
+        return list(self.__timestamps)
+
+    def add(self, author_name: str, date_time: datetime) -> None:
+        "Adds the timestamp of a message sent by the given author."
+        timestamps = self.__timestamps.get(author_name)
+        if timestamps is None:
+            timestamps = self.__timestamps[author_name] = array("d")
+        seconds = to_seconds(date_time)
+        # Exports are chronological, so appending keeps the array sorted.
+        if not timestamps or timestamps[-1] <= seconds:
+            timestamps.append(seconds)
+        else:
+            insort(timestamps, seconds)
+        weekday = date_time.weekday()
+        for key in (None, author_name):
+            self.__get_buckets(self.__hours, key, 24)[date_time.hour] += 1
+            self.__get_buckets(self.__weekdays, key, 7)[weekday] += 1
+            self.__get_buckets(self.__heatmaps, key, 7 * 24)[weekday * 24 + date_time.hour] += 1
+            months = self.__months.get(key)
+            if months is None:
+                months = self.__months[key] = Counter()
+            months[(date_time.year, date_time.month)] += 1
+
+    def count_messages(
+        self, start: Optional[datetime] = None,
+        end: Optional[datetime] = None, author_name: Optional[str] = None
+    ) -> int:
+        """
+        Returns the number of messages sent in [start, end), by one
+        author or by everyone. Missing limits leave the range open.
+        """
+        names = [author_name] if author_name is not None else self.authors
+        total = 0
+        for name in names:
+            timestamps = self.__timestamps.get(name, array("d"))
+            low = bisect_left(timestamps, to_seconds(start)) if start else 0
+            high = bisect_left(timestamps, to_seconds(end)) if end else len(timestamps)
+            total += max(0, high - low)
+        return total
+
+    def get_hourly_activity(self, author_name: Optional[str] = None) -> list[int]:
+        "Returns the number of messages sent in each hour of the day (0-23)."
+        return list(self.__hours.get(author_name, [0] * 24))
+
+    def get_weekday_activity(self, author_name: Optional[str] = None) -> list[int]:
+        "Returns the number of messages sent on each weekday (0 is Monday)."
+        return list(self.__weekdays.get(author_name, [0] * 7))
+
+    def get_heatmap(self, author_name: Optional[str] = None) -> list[list[int]]:
+        "Returns a 7x24 matrix with the messages sent by weekday and hour."
+        buckets = self.__heatmaps.get(author_name, [0] * (7 * 24))
+        return [buckets[day * 24:(day + 1) * 24] for day in range(7)]
+
+    def get_monthly_activity(self, author_name: Optional[str] = None) -> dict[tuple[int, int], int]:
+        "Returns the number of messages sent in each (year, month), sorted."
+        months = self.__months.get(author_name, Counter())
+        return {month: months[month] for month in sorted(months)}
+
+    @staticmethod
+    def __get_buckets(histograms: dict, key: Optional[str], size: int) -> list[int]:
+        buckets = histograms.get(key)
+        if buckets is None:
+            buckets = histograms[key] = [0] * size
+        return buckets
+
 class Chat:
     """
     A class that represents a chat conversation.
 
     Attributes:
         __authors (dict): A dictionary of Author objects indexed by their name.
+        __time_index (TimeIndex): The timestamps and activity histograms of the messages.
     """
     def __init__(self) -> None:
         self.__authors = dict[str, Author]()
+        self.__time_index = TimeIndex()
 
     @property
     def authors(self) -> list[Author]:
         "Returns a list with all the authors in the chat."
         return list(self.__authors.values())
 
+    @property
+    def time_index(self) -> TimeIndex:
+        "Returns the index of the messages of the chat by time."
+        return self.__time_index
+
     def register_message(self, author_name: str, new_message: Message) -> None:
         """
         Registers a new message for a given author. If the author does not
@@ -263,3 +492,155 @@ class Chat:
 
         # Add the new message to the author's message list.
         author.save_message(new_message)
+        self.__time_index.add(author_name, new_message.date_time)
+
+class AuthorSummary:
+    """
+    A class that keeps the aggregates of the messages sent
+    by an author, without storing the messages themselves.
+    The counters are updated as each message arrives, so the
+    memory used does not grow with the number of messages.
+    With a capacity, the words and emojis are counted approximately
+    in SpaceSaving sketches of that many terms, so the memory used
+    does not grow with the vocabulary either.
+
+    Attributes:
+        - name : str
+        - messages : int
+    """
+
+    def __init__(self, name: str, capacity: Optional[int] = None) -> None:
+        self.__name = name
+        self.__messages_count = 0
+        self.__days = set[date]()
+        if capacity is None:
+            self.__emojis = FreqDist()
+            self.__words = FreqDist()
+        else:
+            self.__emojis = SpaceSaving(capacity)
+            self.__words = SpaceSaving(capacity)
+
+    @property
+    def active_days(self) -> int:
+        "Returns the number of days in which the author sent at least one message."
+        return len(self.__days)
+
+    @property
+    def messages(self) -> int:
+        "Returns the total number of messages sent by this author."
+        return self.__messages_count
+
+    @property
+    def name(self) -> str:
+        "Returns the name of the author."
+        return self.__name
+
+    def get_word_frequency(self) -> Union[FreqDist, SpaceSaving]:
+        """
+        Returns a dictionary of all the words that
+        the author has used and their frequency.
+        """
+        return self.__words
+
+    def get_emoji_frequency(self) -> Union[FreqDist, SpaceSaving]:
+        """
+        Returns a dictionary of all the emojis that
+        the author has used and their frequency.
+        """
+        return self.__emojis
+
+    def generate_word_cloud(self) -> None:
+        """
+        Generates a wordcloud image from the words that
+        the author wrote in the chat.
+        """
+        save_word_cloud(self.name, self.__words)
+
+    def get_most_common_words(self, n: int) -> FreqDist:
+        "Returns the n most common words used by the current author."
+        return self.__words.most_common(n)
+
+    def get_most_common_emojis(self, n: int) -> FreqDist:
+        "Returns the n most common emojis used by the current author."
+        return self.__emojis.most_common(n)
+
+    def save_message(self, new_message: Message) -> None:
+        "Adds a new message sent by this author to the aggregates."
+        self.__messages_count += 1
+        self.__days.add(new_message.date_time.date())
+        self.__words.update(new_message.words)
+        self.__emojis.update(new_message.emojis)
+
+    def merge(self, other: "AuthorSummary") -> None:
+        "Adds the aggregates of another summary of the same author."
+        self.__messages_count += other.messages
+        self.__days.update(other.__days)
+        self.__words.update(other.get_word_frequency())
+        self.__emojis.update(other.get_emoji_frequency())
+
+    def __str__(self) -> str:
+        return f"{self.__name}: {self.__messages_count} messages, {self.active_days} active days"
+
+    def __repr__(self) -> str:
+        return f"<AuthorSummary '{self.__name}' with {self.__messages_count} messages sent>"
+
+class ChatSummary:
+    """
+    A class that represents a chat conversation by the
+    aggregates of each author. It is the streaming
+    counterpart of Chat: messages are counted and discarded.
+
+    Attributes:
+        __authors (dict): A dictionary of AuthorSummary objects indexed by their name.
+        __sentiment (SentimentSummary): The sentiment scores of the messages,
+        or None if sentiment=False.
+        __capacity (int): The capacity of the sketches of the words and emojis
+        of each author, or None if they are counted exactly.
+    """
+    def __init__(self, sentiment: bool = False, capacity: Optional[int] = None) -> None:
+        self.__authors = dict[str, AuthorSummary]()
+        self.__sentiment = SentimentSummary() if sentiment else None
+        self.__capacity = capacity
+
+    @property
+    def authors(self) -> list[AuthorSummary]:
+        "Returns a list with all the authors in the chat."
+        return list(self.__authors.values())
+
+    @property
+    def sentiment(self) -> Optional[SentimentSummary]:
+        "Returns the sentiment scores of the chat, if they are computed."
+        return self.__sentiment
+
+    @property
+    def capacity(self) -> Optional[int]:
+        "Returns the capacity of the sketches, or None if the counts are exact."
+        return self.__capacity
+
+    def register_message(self, author_name: str, new_message: Message) -> None:
+        """
+        Adds a new message to the aggregates of the given author.
+        If the author does not exist, creates a new AuthorSummary.
+        """
+        author = self.__authors.get(author_name)
+        if author is None:
+            author = AuthorSummary(author_name, self.__capacity)
+            self.__authors[author_name] = author
+        author.save_message(new_message)
+        if self.__sentiment is not None and not new_message.is_multimedia:
+            self.__sentiment.add(author_name, new_message.date_time.date(), new_message.text)
+
+    def merge(self, other: "ChatSummary") -> None:
+        """
+        Adds the aggregates of another summary to this one.
+        Authors that are not present yet are appended in the
+        order in which they appear in the other summary.
+        """
+        for other_author in other.authors:
+            author = self.__authors.get(other_author.name)
+            if author is None:
+                author = AuthorSummary(other_author.name, self.__capacity)
+                self.__authors[other_author.name] = author
+            author.merge(other_author)
+        if self.__sentiment is not None and other.sentiment is not None:
+            self.__sentiment.merge(other.sentiment)
@@ -0,0 +1,204 @@
+"""
+profiling
+
+This module measures where the time of an analysis goes. A Profiler
+records, for each stage (parsing, tokenization, emoji extraction,
+counting, report, word clouds...), the wall time, the CPU time, the
+peak memory of the process and counts of the items processed (lines,
+messages, tokens, emojis...). The results are printed as a table or
+saved as JSON.
+
+The code under measurement receives NULL_PROFILER when profiling is
+disabled: its stages are shared no-op context managers, so the
+instrumentation can stay in place at almost no cost.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (contextlib, json, sys, time,
+typing, resource if available), downloaded packages (rich).
+"""
+
+from contextlib import nullcontext
+import json
+import sys
+from time import perf_counter, process_time
+from typing import ContextManager, Optional
+
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:
+    getrusage = None
+
+def get_peak_memory() -> Optional[int]:
+    """
+    Returns the peak resident memory of the process in bytes,
+    or None where it is not available (Windows).
+    """
+    if getrusage is None:
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux reports kibibytes, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StageStatistics:
+    """
+    The measurements of one stage: the number of times it ran, its
+    wall and CPU time in seconds, the peak memory of the process in
+    bytes when it last finished, and the counts of items it processed.
+    """
+
+    __slots__ = ("calls", "wall", "cpu", "peak_memory", "counts")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = None
+        self.counts = dict[str, int]()
+
+    def to_dict(self) -> dict:
+        "Returns the statistics as a dictionary that can be saved as JSON."
+        return {
+            "calls": self.calls,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "peak_memory": self.peak_memory,
+            "counts": dict(self.counts),
+        }
+
+class Timer:
+    """
+    A reusable context manager that adds the wall and CPU time of
+    each block it runs to a stage. Without memory, it is cheap
+    enough to wrap the processing of each message.
+    """
+
+    __slots__ = ("__statistics", "__memory", "__wall", "__cpu")
+
+    def __init__(self, statistics: StageStatistics, memory: bool = False) -> None:
+        self.__statistics = statistics
+        self.__memory = memory
+        self.__wall = 0.0
+        self.__cpu = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.__wall = perf_counter()
+        self.__cpu = process_time()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        statistics = self.__statistics
+        statistics.wall += perf_counter() - self.__wall
+        statistics.cpu += process_time() - self.__cpu
+        statistics.calls += 1
+        if self.__memory:
+            statistics.peak_memory = get_peak_memory()
+
+class Profiler:
+    """
+    A Profiler collects the statistics of the stages of a run,
+    in the order in which they first ran.
+
+    Example:
+        ```python
+        profiler = Profiler()
+        with profiler.stage("parse"):
+            ...
+        timer = profiler.timer("tokenize")
+        for message in messages:
+            with timer:
+                ...
+        profiler.count("tokenize", tokens=1000)
+        profiler.print_table()
+        profiler.dump("profile.json")
+        ```
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.__stages = dict[str, StageStatistics]()
+
+    def stage(self, name: str) -> ContextManager:
+        "Returns a context manager that measures a block as the given stage."
+        return Timer(self.__get_statistics(name), memory=True)
+
+    def timer(self, name: str) -> Timer:
+        """
+        Returns a reusable context manager that adds the time of
+        each block to the given stage, without checking the memory.
+        """
+        return Timer(self.__get_statistics(name))
+
+    def count(self, name: str, **counts: int) -> None:
+        "Adds counts of processed items to a stage."
+        stage_counts = self.__get_statistics(name).counts
+        for item, count in counts.items():
+            stage_counts[item] = stage_counts.get(item, 0) + count
+
+    def get_statistics(self) -> dict[str, dict]:
+        "Returns the statistics of every stage as dictionaries."
+        return {name: statistics.to_dict() for name, statistics in self.__stages.items()}
+
+    def dump(self, path: str) -> None:
+        "Saves the statistics of every stage in a JSON file."
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(self.get_statistics(), file, indent=2)
+            file.write("\n")
+
+    def print_table(self) -> None:
+        """
+        Prints the statistics as a table in the standard error,
+        so it does not mix with results written to the standard output.
+        """
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(title="[bold blue]Perfil de la ejecución[/bold blue]")
+        table.add_column("Etapa", justify="right")
+        for column in ("Llamadas", "Tiempo (ms)", "CPU (ms)", "Memoria máx. (MiB)"):
+            table.add_column(column, justify="center", style="green")
+        table.add_column("Elementos", justify="left")
+        for name, statistics in self.__stages.items():
+            memory = statistics.peak_memory
+            table.add_row(
+                name, str(statistics.calls),
+                f"{statistics.wall * 1000:.1f}", f"{statistics.cpu * 1000:.1f}",
+                f"{memory / 2 ** 20:.1f}" if memory is not None else "-",
+                ", ".join(f"{item}: {count}" for item, count in statistics.counts.items())
+            )
+        Console(stderr=True).print(table, justify="center")
+
+    def __get_statistics(self, name: str) -> StageStatistics:
+        statistics = self.__stages.get(name)
+        if statistics is None:
+            statistics = self.__stages[name] = StageStatistics()
+        return statistics
+
+class NullProfiler:
+    """
+    A Profiler that measures nothing. Its stages and timers are
+    one shared no-op context manager.
+    """
+
+    enabled = False
+
+    def __init__(self) -> None:
+        self.__context = nullcontext()
+
+    def stage(self, name: str) -> ContextManager:
+        "Returns a context manager that does nothing."
+        return self.__context
+
+    def timer(self, name: str) -> ContextManager:
+        "Returns a context manager that does nothing."
+        return self.__context
+
+    def count(self, name: str, **counts: int) -> None:
+        "Does nothing."
+
+    def get_statistics(self) -> dict[str, dict]:
+        "Returns no statistics."
+        return {}
+
+NULL_PROFILER = NullProfiler()
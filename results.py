@@ -1,22 +1,72 @@
 """
 results
 
+This module builds the results of the analysis of a chat:
+ConsoleBuilder prints rich tables for people, and JsonLinesBuilder
+and ColumnarBuilder write the aggregates of each author to files
+that other programs can load directly.
+
 Author: Christopher Villamarín (xeland314)
 
-Dependencies: standard python modules (abc),
-downloaded packages (emoji, nltk, rich).
+Dependencies: standard python modules (abc, json, os, sys, typing),
+downloaded packages (emoji, numpy, rich),
+own modules (aggregation, images, models).
 """
 
 from abc import ABCMeta, abstractmethod
+import json
+import os
+import sys
+from typing import Optional, TextIO, Union
+
+import numpy as np
 
 from emoji import demojize
-from nltk.probability import FreqDist
 from rich import print as rprint
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 
-from models import Chat
+from aggregation import FrequencyMatrix
+from images import IMAGE_CACHE_DIRECTORY, RESULTS_DIRECTORY, save_word_clouds
+from models import Chat, ChatSummary
+
+SENTIMENT_DAYS = 15
+DISTINCTIVE_WORDS = 5
+FORMATS = ("console", "jsonl", "columnar")
+STATISTICS = ("count", "mean", "p10", "p50", "p90")
+
+def format_sentiment(statistics: dict[str, float]) -> list[str]:
+    "Formats the count, mean and percentiles of a sentiment series."
+    return [
+        str(statistics["count"]),
+        *(f"{statistics[name]:+.3f}" for name in ("mean", "p10", "p50", "p90"))
+    ]
+
+def save_images(authors: list, parameters: dict) -> None:
+    "Saves the word clouds of the authors, as set in the parameters."
+    save_word_clouds(
+        authors,
+        jobs=parameters.get("image_jobs", 1),
+        threads=parameters.get("image_threads", False),
+        min_messages=parameters.get("min_messages", 0),
+        cache_dir=parameters.get("image_cache", IMAGE_CACHE_DIRECTORY)
+    )
+
+def get_builder(
+    output_format: str = "console", output: Union[str, TextIO, None] = None
+) -> "ResultBuilder":
+    """
+    Returns the builder of the given format. `output` is the
+    file written by the jsonl and columnar formats.
+    """
+    if output_format == "console":
+        return ConsoleBuilder()
+    if output_format == "jsonl":
+        return JsonLinesBuilder(output)
+    if output_format == "columnar":
+        return ColumnarBuilder(output)
+    raise ValueError(f"Unknown format {output_format}, use one of {FORMATS}.")
 
 class ResultBuilder(metaclass=ABCMeta):
     """
@@ -27,6 +77,10 @@ class ResultBuilder(metaclass=ABCMeta):
     def __init__(self) -> None:
         self._chat = None
         self._authors = None
+        self._words = None
+        self._emojis = None
+        self._error_bounds = None
+        self._totals = None
         self._parameters = {}
 
     @abstractmethod
@@ -56,6 +110,24 @@ class ResultBuilder(metaclass=ABCMeta):
         """
         raise NotImplementedError("Should implement build_words_panel()")
     
+    def build_sentiment_panel(self) -> None:
+        """
+        This method can be overridden
+        to build the sentiment panel to show
+        as a result of the analysis. By default
+        it builds nothing.
+        """
+        return
+
+    def build_chat_panel(self) -> None:
+        """
+        This method can be overridden
+        to build the chat-wide rankings to show
+        as a result of the analysis. By default
+        it builds nothing.
+        """
+        return
+
     @abstractmethod
     def build_images(self) -> None:
         """
@@ -72,14 +144,81 @@ class ResultBuilder(metaclass=ABCMeta):
         """
         raise NotImplementedError("Should implement build_all()")     
 
+    @abstractmethod
+    def print_results(self) -> None:
+        """
+        This method should be implemented
+        to output the results once they are built.
+        """
+        raise NotImplementedError("Should implement print_results()")
+
     def reset(self) -> None:
         "This method resets the _chat attribute to None."
         self._chat = None
+        self._words = None
+        self._emojis = None
+        self._error_bounds = None
+        self._totals = None
 
-    def set_chat(self, chat: Chat) -> None:
-        "This method sets the chat to be analyzed."
+    def set_chat(self, chat: Union[Chat, ChatSummary]) -> None:
+        """
+        This method sets the chat to be analyzed, and builds
+        the matrices of words and emojis of its authors.
+        """
         self._chat = chat
         self._authors = chat.authors
+        self._words = FrequencyMatrix.from_authors(self._authors, "words")
+        self._emojis = FrequencyMatrix.from_authors(self._authors, "emojis")
+        self._error_bounds = None
+        self._totals = None
+        if getattr(chat, "capacity", None) is not None:
+            sketches = {
+                "words": {author.name: author.get_word_frequency() for author in self._authors},
+                "emojis": {author.name: author.get_emoji_frequency() for author in self._authors},
+            }
+            self._error_bounds = {
+                kind: {name: sketch.error_bound for name, sketch in kind_sketches.items()}
+                for kind, kind_sketches in sketches.items()
+            }
+            self._totals = {
+                kind: {name: sketch.total for name, sketch in kind_sketches.items()}
+                for kind, kind_sketches in sketches.items()
+            }
+
+    def get_error_bound(self, kind: str, author_name: Optional[str] = None) -> Optional[int]:
+        """
+        Returns the most by which the counts of words or emojis of an
+        author, or of the whole chat if no author is given, can exceed
+        the true counts. It is None when they were counted exactly.
+        """
+        if self._error_bounds is None:
+            return None
+        bounds = self._error_bounds[kind]
+        return bounds[author_name] if author_name is not None else sum(bounds.values())
+
+    def count_total(self, kind: str, author_name: Optional[str] = None) -> int:
+        """
+        Returns the number of words or emojis counted for an author,
+        or for the whole chat. With approximate counts, it is the exact
+        total of the sketches, since the sum of their counts includes
+        the errors.
+        """
+        if self._totals is None:
+            matrix = self._words if kind == "words" else self._emojis
+            return matrix.count_total(author_name)
+        totals = self._totals[kind]
+        return totals[author_name] if author_name is not None else sum(totals.values())
+
+    def count_terms(self, kind: str, author_name: Optional[str] = None) -> Optional[int]:
+        """
+        Returns the number of distinct words or emojis of an author, or
+        of the whole chat. It is None with approximate counts, since the
+        sketches only hold part of the vocabulary.
+        """
+        if self._error_bounds is not None:
+            return None
+        matrix = self._words if kind == "words" else self._emojis
+        return matrix.count_terms(author_name)
 
     def set_parameters(self, parameters: dict) -> None:
         """
@@ -100,6 +239,8 @@ class ConsoleBuilder(ResultBuilder):
         self.__emoji_tables = list[Table]()
         self.__word_tables = list[Table]()
         self.__word_panels = list[Panel]()
+        self.__sentiment_tables = list[Table]()
+        self.__chat_tables = list[Table]()
 
     def build_titles(self) -> None:
         title_content = ""
@@ -117,10 +258,10 @@ class ConsoleBuilder(ResultBuilder):
             table.add_column("Descripción", justify="center", style="cyan")
             table.add_column("Frecuencia", justify="center", style="green")
 
-            emojis: FreqDist = author.get_emoji_frequency()
-            for emoji, count in emojis.most_common(self._parameters["emojis"]):
+            for emoji, count in self._emojis.get_most_common(self._parameters["emojis"], author.name):
                 demoji = demojize(emoji, delimiters=("_", "_"), language="es")
                 table.add_row(emoji, demoji.replace("_", " "), str(count))
+            self.__add_error_caption(table, "emojis", author.name)
             self.__emoji_tables.append(table)
 
     def build_words_panel(self) -> None:
@@ -131,36 +272,369 @@ class ConsoleBuilder(ResultBuilder):
             table.add_column("Palabra", justify="right")
             table.add_column("Frecuencia", justify="center", style="green")
 
-            words: FreqDist = author.get_word_frequency()
-            for word, count in words.most_common(self._parameters["words"]):
+            for word, count in self._words.get_most_common(self._parameters["words"], author.name):
                 table.add_row(word, str(count))
+            self.__add_error_caption(table, "words", author.name)
             self.__word_tables.append(table)
             
             # Create the summary word panel:
-            word_panel_content = \
-                f"Cantidad de palabras únicas: [bold green]{words.B()}[/bold green]\n"
-            word_panel_content += f"Total de palabras: [bold green]{words.N()}[/bold green]\n"
+            unique_words = self.count_terms("words", author.name)
+            total_words = self.count_total("words", author.name)
+            word_panel_content = ""
+            if unique_words is not None:
+                word_panel_content += \
+                    f"Cantidad de palabras únicas: [bold green]{unique_words}[/bold green]\n"
+            word_panel_content += f"Total de palabras: [bold green]{total_words}[/bold green]\n"
             # word_panel_content += f"Riqueza léxica: [bold green]{lexical_richness}[/bold green]"
             self.__word_panels.append(
                 Panel(word_panel_content, title=f"Palabras empleadas por {author.name}")
             )
 
+    def build_sentiment_panel(self) -> None:
+        sentiment = getattr(self._chat, "sentiment", None)
+        if sentiment is None:
+            return
+        table = Table(title="[bold blue]Sentimiento por autor[/bold blue]")
+        table.add_column("Autor", justify="right")
+        for column in ("Mensajes", "Media", "P10", "Mediana", "P90"):
+            table.add_column(column, justify="center", style="green")
+        for author, statistics in sentiment.get_author_statistics().items():
+            table.add_row(author, *format_sentiment(statistics))
+        self.__sentiment_tables.append(table)
+
+        days = list(sentiment.get_daily_statistics().items())[-SENTIMENT_DAYS:]
+        table = Table(title="[bold blue]Sentimiento de los últimos días[/bold blue]")
+        table.add_column("Día", justify="right")
+        for column in ("Mensajes", "Media", "P10", "Mediana", "P90"):
+            table.add_column(column, justify="center", style="green")
+        for day, statistics in days:
+            table.add_row(day.isoformat(), *format_sentiment(statistics))
+        self.__sentiment_tables.append(table)
+
+    def build_chat_panel(self) -> None:
+        table = Table(title="[bold blue]Palabras más usadas en el chat[/bold blue]")
+        table.add_column("Palabra", justify="right")
+        table.add_column("Frecuencia", justify="center", style="green")
+        for word, count in self._words.get_most_common(self._parameters["words"]):
+            table.add_row(word, str(count))
+        self.__add_error_caption(table, "words")
+        self.__chat_tables.append(table)
+
+        table = Table(title="[bold blue]Emojis más usados en el chat[/bold blue]")
+        table.add_column("Emoji", justify="center")
+        table.add_column("Frecuencia", justify="center", style="green")
+        for emoji, count in self._emojis.get_most_common(self._parameters["emojis"]):
+            table.add_row(emoji, str(count))
+        self.__add_error_caption(table, "emojis")
+        self.__chat_tables.append(table)
+
+        table = Table(title="[bold blue]Palabras distintivas de cada autor[/bold blue]")
+        table.add_column("Autor", justify="right")
+        table.add_column("Palabras", justify="left", style="green")
+        distinctive = self._words.get_distinctive_terms(DISTINCTIVE_WORDS)
+        for author, words in distinctive.items():
+            table.add_row(author, ", ".join(word for word, _ in words))
+        self.__chat_tables.append(table)
+
     def build_images(self) -> None:
-        for author in self._authors:
-            author.generate_word_cloud()
+        save_images(self._authors, self._parameters)
 
     def build_all(self) -> None:
         self.build_titles()
         self.build_emojis_panel()
         self.build_words_panel()
-        self.build_images()
+        if self._parameters.get("sentiment"):
+            self.build_sentiment_panel()
+        if self._parameters.get("chat"):
+            self.build_chat_panel()
+        if self._parameters.get("images", True):
+            self.build_images()
 
     def print_results(self) -> None:
         "Prints the analysis results in the console."
         rprint(self.__title_panel)
         console = Console()
+        for table in self.__chat_tables:
+            console.print(table, justify="center")
         for table in self.__emoji_tables:
             console.print(table, justify="center")
         for panel, table in zip(self.__word_panels, self.__word_tables):
             rprint(panel)
             console.print(table, justify="center")
+        for table in self.__sentiment_tables:
+            console.print(table, justify="center")
+
+    def __add_error_caption(self, table: Table, kind: str, author_name: Optional[str] = None) -> None:
+        "Notes the error bound of approximate counts below a table."
+        bound = self.get_error_bound(kind, author_name)
+        if bound is not None:
+            table.caption = f"Aproximadas: error ≤ {bound}"
+
+class JsonLinesBuilder(ResultBuilder):
+    """
+    This class writes the analysis results as JSON Lines: one JSON
+    object per line, with a "type" field that tells what it holds
+    ("chat", "author", "words", "emojis", "author_sentiment",
+    "daily_sentiment", "chat_words", "chat_emojis" or
+    "distinctive_words"). Each record is written as soon as it is
+    built, and the word and emoji records hold the full frequencies
+    of each author, sorted from the most common. With approximate
+    counts, the "chat" record holds the capacity of the sketches,
+    the frequency records the error bound ("max_error") and the
+    error of each count ("errors"), and the "chat" and "author"
+    records leave out "unique_words" and "unique_emojis", which the
+    sketches do not know.
+
+    Parameters:
+        - output: str, the path of the file, or "-" / None to
+        write to the standard output. It can also be an open text
+        stream (for example, a StringIO), which is not closed.
+    """
+
+    def __init__(self, output: Union[str, TextIO, None] = None) -> None:
+        super().__init__()
+        self.__output = output
+        self.__file: Optional[TextIO] = None
+
+    def build_titles(self) -> None:
+        self.__write({
+            "type": "chat",
+            "authors": len(self._authors),
+            "messages": sum(author.messages for author in self._authors),
+            **self.__get_counts(),
+            **({"approximate": self._chat.capacity} if self._error_bounds else {}),
+        })
+        for author in self._authors:
+            words = self.count_total("words", author.name)
+            emojis = self.count_total("emojis", author.name)
+            self.__write({
+                "type": "author",
+                "author": author.name,
+                "messages": author.messages,
+                "active_days": author.active_days,
+                **self.__get_counts(author.name),
+                "words_per_message": words / author.messages if author.messages else 0.0,
+                "emojis_per_message": emojis / author.messages if author.messages else 0.0,
+            })
+
+    def build_emojis_panel(self) -> None:
+        self.__write_frequencies("emojis", self._emojis)
+
+    def build_words_panel(self) -> None:
+        self.__write_frequencies("words", self._words)
+
+    def build_sentiment_panel(self) -> None:
+        sentiment = getattr(self._chat, "sentiment", None)
+        if sentiment is None:
+            return
+        for author, statistics in sentiment.get_author_statistics().items():
+            self.__write({"type": "author_sentiment", "author": author, **statistics})
+        for day, statistics in sentiment.get_daily_statistics().items():
+            self.__write({"type": "daily_sentiment", "day": day.isoformat(), **statistics})
+
+    def build_chat_panel(self) -> None:
+        self.__write({
+            "type": "chat_words",
+            "frequencies": dict(self._words.get_most_common(self._parameters["words"])),
+            **self.__get_errors("words"),
+        })
+        self.__write({
+            "type": "chat_emojis",
+            "frequencies": dict(self._emojis.get_most_common(self._parameters["emojis"])),
+            **self.__get_errors("emojis"),
+        })
+        distinctive = self._words.get_distinctive_terms(DISTINCTIVE_WORDS)
+        for author, words in distinctive.items():
+            self.__write({"type": "distinctive_words", "author": author, "scores": dict(words)})
+
+    def build_images(self) -> None:
+        save_images(self._authors, self._parameters)
+
+    def build_all(self) -> None:
+        self.build_titles()
+        self.build_emojis_panel()
+        self.build_words_panel()
+        if self._parameters.get("sentiment"):
+            self.build_sentiment_panel()
+        if self._parameters.get("chat"):
+            self.build_chat_panel()
+        if self._parameters.get("images", True):
+            self.build_images()
+
+    def print_results(self) -> None:
+        "Closes the output, since the records are already written."
+        if self.__file is sys.stdout or self.__file is self.__output:
+            self.__file.flush()
+        elif self.__file is not None:
+            self.__file.close()
+        self.__file = None
+
+    def __write_frequencies(self, kind: str, matrix: FrequencyMatrix) -> None:
+        for author in self._authors:
+            frequencies = matrix.get_most_common(matrix.count_terms(author.name), author.name)
+            self.__write({
+                "type": kind, "author": author.name, "frequencies": dict(frequencies),
+                **self.__get_errors(kind, author, frequencies),
+            })
+
+    def __get_counts(self, author_name: Optional[str] = None) -> dict:
+        "Returns the totals and, with exact counts, the distinct words and emojis."
+        counts = dict[str, int]()
+        for kind in ("words", "emojis"):
+            counts[kind] = self.count_total(kind, author_name)
+            unique = self.count_terms(kind, author_name)
+            if unique is not None:
+                counts[f"unique_{kind}"] = unique
+        return counts
+
+    def __get_errors(self, kind: str, author=None, frequencies: list = ()) -> dict:
+        "Returns the error fields of a frequency record, if the counts are approximate."
+        if self._error_bounds is None:
+            return {}
+        errors = {"max_error": self.get_error_bound(kind, author.name if author else None)}
+        if author is not None:
+            sketch = author.get_word_frequency() if kind == "words" else author.get_emoji_frequency()
+            errors["errors"] = {term: sketch.get_error(term) for term, _ in frequencies}
+        return errors
+
+    def __write(self, record: dict) -> None:
+        if self.__file is None:
+            if self.__output in (None, "-"):
+                self.__file = sys.stdout
+            elif hasattr(self.__output, "write"):
+                self.__file = self.__output
+            else:
+                self.__file = open(self.__output, "w", encoding="utf8")
+        self.__file.write(json.dumps(record, ensure_ascii=False))
+        self.__file.write("\n")
+
+class ColumnarBuilder(ResultBuilder):
+    """
+    This class writes the analysis results as columns of numpy
+    arrays in a compressed `.npz` file, which loads without pickle
+    (`numpy.load(path)`) and converts directly into data frames.
+
+    Columns:
+        - authors/*: one row per author (name, messages, active_days,
+        words, unique_words, emojis, unique_emojis, words_per_message,
+        emojis_per_message, and with approximate counts words_error
+        and emojis_error, the error bounds of the counts, instead of
+        unique_words and unique_emojis).
+        - words/* and emojis/*: one row per author and term (author,
+        the row of the author in authors/*; term; count).
+        - sentiment/author/* and sentiment/day/*: with sentiment, the
+        count, mean and percentiles of each author and of each day.
+        - distinctive/*: with the chat rankings, the distinctive
+        words of each author (author, term, score).
+
+    Parameters:
+        - output: str, the path of the file
+        (default: results/summary.npz).
+    """
+
+    def __init__(self, output: Optional[str] = None) -> None:
+        super().__init__()
+        self.__output = output or os.path.join(RESULTS_DIRECTORY, "summary.npz")
+        self.__columns = dict[str, np.ndarray]()
+
+    def build_titles(self) -> None:
+        messages = np.array([author.messages for author in self._authors], dtype=np.int64)
+        if self._totals is None:
+            words = self._words.get_author_totals()
+            emojis = self._emojis.get_author_totals()
+        else:
+            words, emojis = (
+                np.array([self.count_total(kind, author.name) for author in self._authors],
+                         dtype=np.int64)
+                for kind in ("words", "emojis")
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            words_per_message = np.where(messages > 0, words / messages, 0.0)
+            emojis_per_message = np.where(messages > 0, emojis / messages, 0.0)
+        self.__columns.update({
+            "authors/name": np.array([author.name for author in self._authors], dtype=str),
+            "authors/messages": messages,
+            "authors/active_days": np.array(
+                [author.active_days for author in self._authors], dtype=np.int64
+            ),
+        })
+        for kind, totals in (("words", words), ("emojis", emojis)):
+            self.__columns[f"authors/{kind}"] = totals
+            if self._error_bounds is None:
+                self.__columns[f"authors/unique_{kind}"] = np.array(
+                    [self.count_terms(kind, author.name) for author in self._authors],
+                    dtype=np.int64
+                )
+        self.__columns["authors/words_per_message"] = words_per_message
+        self.__columns["authors/emojis_per_message"] = emojis_per_message
+        if self._error_bounds is not None:
+            for kind in ("words", "emojis"):
+                self.__columns[f"authors/{kind}_error"] = np.array(
+                    [self.get_error_bound(kind, author.name) for author in self._authors],
+                    dtype=np.int64
+                )
+
+    def build_emojis_panel(self) -> None:
+        self.__add_entries("emojis", self._emojis)
+
+    def build_words_panel(self) -> None:
+        self.__add_entries("words", self._words)
+
+    def build_sentiment_panel(self) -> None:
+        sentiment = getattr(self._chat, "sentiment", None)
+        if sentiment is None:
+            return
+        authors = sentiment.get_author_statistics()
+        days = sentiment.get_daily_statistics()
+        self.__columns["sentiment/author/author"] = np.array(list(authors), dtype=str)
+        self.__columns["sentiment/day/day"] = \
+            np.array([day.isoformat() for day in days], dtype=str)
+        for prefix, series in (("sentiment/author", authors), ("sentiment/day", days)):
+            for name in STATISTICS:
+                dtype = np.int64 if name == "count" else np.float64
+                self.__columns[f"{prefix}/{name}"] = \
+                    np.array([statistics[name] for statistics in series.values()], dtype=dtype)
+
+    def build_chat_panel(self) -> None:
+        distinctive = self._words.get_distinctive_terms(DISTINCTIVE_WORDS)
+        rows = {name: row for row, name in enumerate(self._words.authors)}
+        entries = [
+            (rows[author], word, score)
+            for author, words in distinctive.items() for word, score in words
+        ]
+        self.__columns["distinctive/author"] = \
+            np.array([row for row, _, _ in entries], dtype=np.int64)
+        self.__columns["distinctive/term"] = \
+            np.array([word for _, word, _ in entries], dtype=str)
+        self.__columns["distinctive/score"] = \
+            np.array([score for _, _, score in entries], dtype=np.float64)
+
+    def build_images(self) -> None:
+        save_images(self._authors, self._parameters)
+
+    def build_all(self) -> None:
+        self.build_titles()
+        self.build_emojis_panel()
+        self.build_words_panel()
+        if self._parameters.get("sentiment"):
+            self.build_sentiment_panel()
+        if self._parameters.get("chat"):
+            self.build_chat_panel()
+        if self._parameters.get("images", True):
+            self.build_images()
+
+    def print_results(self) -> None:
+        "Writes the columns to the output file."
+        directory = os.path.dirname(self.__output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.__output, "wb") as file:
+            np.savez_compressed(file, **self.__columns)
+        self.__columns = {}
+
+    def __add_entries(self, kind: str, matrix: FrequencyMatrix) -> None:
+        rows, ids, counts = matrix.get_entries()
+        terms = np.array(matrix.terms, dtype=str) if matrix.terms else np.array([], dtype=str)
+        self.__columns[f"{kind}/author"] = rows
+        self.__columns[f"{kind}/term"] = terms[ids]
+        self.__columns[f"{kind}/count"] = counts
@@ -0,0 +1,186 @@
+"""
+sentiment
+
+This module scores the sentiment of the messages of a chat with the
+VADER analyzer of nltk and aggregates the scores per author and per day.
+
+Messages are not scored one at a time while the chat is parsed:
+SentimentSummary collects their texts and scores them in batches,
+either in the current process or in a pool of processes, so parsing
+and scoring can run at the same time. The scores are kept in compact
+arrays, grouped by author and day, which are saved together with the
+rest of the summary by the analysis cache.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (array, collections, concurrent,
+datetime, math, typing), downloaded packages (nltk).
+"""
+
+from array import array
+from collections import deque
+from concurrent.futures import Executor, Future
+from datetime import date
+from math import floor
+from typing import Optional
+
+BATCH_SIZE = 2000
+MAX_PENDING_BATCHES_PER_WORKER = 2
+
+sentiment_analyzer = None
+
+def get_sentiment_analyzer():
+    """
+    Returns the VADER sentiment analyzer. It is created on first
+    use, since loading its lexicon is slow and most runs never
+    need it.
+    """
+    global sentiment_analyzer
+    if sentiment_analyzer is None:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        sentiment_analyzer = SentimentIntensityAnalyzer()
+    return sentiment_analyzer
+
+def score_texts(texts: list[str]) -> list[float]:
+    """
+    Returns the compound VADER score, between -1 and 1,
+    of each text. It is the unit of work sent to the pool.
+    """
+    polarity_scores = get_sentiment_analyzer().polarity_scores
+    return [polarity_scores(text)["compound"] for text in texts]
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    "Returns a percentile of sorted values, interpolating linearly."
+    position = (len(sorted_values) - 1) * fraction
+    lower = floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+def describe(scores: list[float]) -> dict[str, float]:
+    """
+    Returns the number of scores, their mean and
+    their 10th, 50th and 90th percentiles.
+    """
+    values = sorted(scores)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p10": percentile(values, 0.1),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+    }
+
+class SentimentSummary:
+    """
+    SentimentSummary keeps the sentiment scores of the
+    messages of a chat, grouped by author and day.
+
+    Parameters:
+        - batch_size: int, number of messages scored together.
+
+    Notes:
+        - add() only stores the text; it is scored when a batch
+        is complete or when flush() is called.
+        - With set_executor(), batches are submitted to a pool and
+        scored while the chat is still being parsed. The number of
+        batches in flight is bounded, so memory stays bounded too.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE) -> None:
+        self.__batch_size = batch_size
+        self.__scores = dict[str, dict[date, array]]()
+        self.__keys = list[tuple[str, date]]()
+        self.__texts = list[str]()
+        self.__executor = None
+        self.__max_in_flight = 0
+        self.__in_flight = deque[tuple[list[tuple[str, date]], Future]]()
+
+    def set_executor(self, executor: Optional[Executor], workers: int = 1) -> None:
+        """
+        Sets the pool used to score the batches,
+        or None to score them in the current process.
+        """
+        self.flush()
+        self.__executor = executor
+        self.__max_in_flight = max(1, workers) * MAX_PENDING_BATCHES_PER_WORKER
+
+    def add(self, author: str, day: date, text: str) -> None:
+        "Adds a message to be scored."
+        self.__keys.append((author, day))
+        self.__texts.append(text)
+        if len(self.__texts) >= self.__batch_size:
+            self.__submit()
+
+    def flush(self) -> None:
+        "Scores the pending messages and waits for the batches in flight."
+        if self.__texts:
+            self.__submit()
+        while self.__in_flight:
+            self.__collect()
+
+    def merge(self, other: "SentimentSummary") -> None:
+        "Adds the scores of another summary to this one."
+        self.flush()
+        other.flush()
+        for author, days in other.__scores.items():
+            for day, scores in days.items():
+                self.__get_scores(author, day).extend(scores)
+
+    def get_author_statistics(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the count, mean and percentiles
+        of the scores of each author.
+        """
+        self.flush()
+        statistics = {}
+        for author, days in self.__scores.items():
+            scores = [score for day_scores in days.values() for score in day_scores]
+            statistics[author] = describe(scores)
+        return statistics
+
+    def get_daily_statistics(self, author: Optional[str] = None) -> dict[date, dict[str, float]]:
+        """
+        Returns the count, mean and percentiles of the scores of
+        each day, sorted by date, for one author or for the whole chat.
+        """
+        self.flush()
+        authors = [author] if author is not None else list(self.__scores)
+        daily_scores = dict[date, list[float]]()
+        for name in authors:
+            for day, scores in self.__scores.get(name, {}).items():
+                daily_scores.setdefault(day, []).extend(scores)
+        return {day: describe(daily_scores[day]) for day in sorted(daily_scores)}
+
+    def __submit(self) -> None:
+        keys, texts = self.__keys, self.__texts
+        self.__keys, self.__texts = [], []
+        if self.__executor is None:
+            self.__store(keys, score_texts(texts))
+            return
+        self.__in_flight.append((keys, self.__executor.submit(score_texts, texts)))
+        if len(self.__in_flight) > self.__max_in_flight:
+            self.__collect()
+
+    def __collect(self) -> None:
+        keys, future = self.__in_flight.popleft()
+        self.__store(keys, future.result())
+
+    def __store(self, keys: list[tuple[str, date]], scores: list[float]) -> None:
+        for (author, day), score in zip(keys, scores):
+            self.__get_scores(author, day).append(score)
+
+    def __get_scores(self, author: str, day: date) -> array:
+        days = self.__scores.setdefault(author, {})
+        scores = days.get(day)
+        if scores is None:
+            scores = days[day] = array("d")
+        return scores
+
+    def __getstate__(self) -> dict:
+        # The pool and the batches in flight can not be pickled.
+        self.flush()
+        state = self.__dict__.copy()
+        state["_SentimentSummary__executor"] = None
+        state["_SentimentSummary__in_flight"] = deque()
+        return state
@@ -0,0 +1,377 @@
+"""
+server - analyze WhatsApp chats on demand
+
+This module runs a local HTTP server that analyzes chats on request.
+The cost of a cold start (importing the analysis stack, nltk punkt,
+the stop words and, with `--sentiment`, the VADER lexicon) is paid
+once, when the server starts, by each worker of the pool: the
+requests only pay for the analysis itself.
+
+The chats are analyzed in a bounded pool of processes (or threads
+with `--threads`). At most `--queue` requests are accepted at once,
+running or waiting for a worker; the rest are answered with 503,
+so a burst of requests does not pile up without limit.
+
+Routes:
+- `GET /health`: The state of the server, as JSON.
+- `POST /analyze`: Analyzes the chat sent as the body of the request
+  (plain text, or a .zip export or gzipped chat with the Content-Type
+  `application/zip` or `application/gzip`), or the file of the server
+  given in `?path=`, which must be inside the `--root` directory (the
+  parameter is refused without one). The response is the
+  report in JSON Lines (see `results.JsonLinesBuilder`), without the
+  word clouds. The options are given in the query string: `words`,
+  `emojis`, `sentiment`, `global`, `since` and `until` (YYYY-MM-DD),
+  `author` (it can be repeated) and `approximate` (see `chat_analyzer.py`).
+
+The errors are answered with their status and a JSON object
+`{"error": "..."}`.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies:
+- asyncio
+- concurrent
+- datetime
+- io
+- json
+- os
+- tempfile
+- typing
+- urllib
+- typer
+- analyzer (custom module)
+
+Usage:
+- `python server.py --port 8080 --jobs 4`
+- `curl --data-binary @chat.txt "localhost:8080/analyze?words=10&global=1"`
+- `python server.py --root /chats`
+- `curl -X POST "localhost:8080/analyze?path=chat.txt&author=Ana"`
+- `python server.py --unix /tmp/chat_analyzer.sock`
+
+Options:
+- `--host`, `--port`: Address of the server (default: `127.0.0.1:8080`).
+- `--unix`: Listen on this Unix socket instead of TCP.
+- `--jobs`, `-j`: Number of workers (default: the number of CPUs).
+- `--threads`: Analyze the chats in threads instead of processes.
+- `--queue`: Maximum number of requests accepted at once (default: 4 per worker).
+- `--max-upload`: Maximum size of an uploaded chat in MiB (default: 256).
+- `--root`: Directory of the chats that can be analyzed with `?path=`
+  (default: none, only uploads are accepted).
+- `--cache-dir`, `-c`: Directory where the analyses are cached.
+- `--fast-tokenizer`: As in `chat_analyzer.py`.
+- `--sentiment`, `-s`: Also load the VADER lexicon at start-up.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import StringIO
+import json
+import os
+from tempfile import NamedTemporaryFile
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from typer import run, Option
+
+from analyzer import MessageFilter, WhatsappStatisticalAnalyzer, load_resources
+
+READ_SIZE = 1 << 16
+MAX_HEADER_LINES = 100
+UPLOAD_SUFFIXES = {"application/zip": ".zip", "application/gzip": ".gz"}
+REASONS = {
+    200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+class HttpError(Exception):
+    "An error answered to the client with the given status."
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+def analyze(filename: str, options: dict) -> str:
+    """
+    Analyzes a chat and returns its report in JSON Lines.
+    It runs in the workers of the server.
+    """
+    output = StringIO()
+    analyzer = WhatsappStatisticalAnalyzer(
+        filename, images=False, output_format="jsonl", output=output, **options
+    )
+    analyzer.print_summary()
+    return output.getvalue()
+
+def get_options(query: str, cache_dir: Optional[str], tokenizer: str) -> dict:
+    """
+    Returns the options of the analysis given in the query string.
+
+    Raises:
+        HttpError: If an option is not valid.
+    """
+    parameters = parse_qs(query)
+
+    def get(name: str) -> Optional[str]:
+        values = parameters.get(name)
+        return values[-1] if values else None
+
+    def get_flag(name: str) -> bool:
+        return (get(name) or "").lower() in ("1", "true", "yes")
+
+    def get_date(name: str) -> Optional[datetime]:
+        value = get(name)
+        try:
+            return datetime.strptime(value, "%Y-%m-%d") if value else None
+        except ValueError:
+            raise HttpError(400, f"La fecha {name}={value} no es YYYY-MM-DD.") from None
+
+    try:
+        words = int(get("words") or 30)
+        emojis = int(get("emojis") or 15)
+        approximate = int(get("approximate")) if get("approximate") else None
+    except ValueError:
+        raise HttpError(400, "words, emojis y approximate deben ser números enteros.") from None
+    if approximate is not None and approximate < 1:
+        raise HttpError(400, "approximate debe ser positivo.")
+    until = get_date("until")
+    # until includes the whole day, the filter excludes its end.
+    message_filter = MessageFilter(
+        get_date("since"), until + timedelta(days=1) if until else None,
+        parameters.get("author")
+    )
+    return {
+        "words": words, "emojis": emojis, "cache_dir": cache_dir,
+        "tokenizer": tokenizer, "sentiment": get_flag("sentiment"),
+        "chat_ranking": get_flag("global"), "message_filter": message_filter,
+        "approximate": approximate,
+    }
+
+class AnalysisServer:
+    """
+    The AnalysisServer answers the HTTP requests of a connection
+    and sends the analyses to a pool of workers.
+
+    Parameters:
+        - executor: the pool of workers, started with load_resources.
+        - queue: the maximum number of requests accepted at once.
+        - max_upload: the maximum size of an uploaded chat in bytes.
+        - cache_dir: the directory where the analyses are cached (optional).
+        - tokenizer: "nltk" or "fast".
+        - root: the directory of the chats that can be analyzed with
+        `?path=` (optional). Without it, only uploads are accepted.
+    """
+
+    def __init__(
+        self, executor: Executor, queue: int, max_upload: int,
+        cache_dir: Optional[str] = None, tokenizer: str = "nltk",
+        root: Optional[str] = None
+    ) -> None:
+        self.__executor = executor
+        self.__queue = queue
+        self.__max_upload = max_upload
+        self.__cache_dir = cache_dir
+        self.__tokenizer = tokenizer
+        self.__root = os.path.realpath(root) if root else None
+        self.__pending = 0
+        self.__served = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        "Answers one request and closes the connection."
+        try:
+            status, content_type, body = await self.__respond(reader)
+        except HttpError as error:
+            status, content_type, body = error.status, "application/json", \
+                json.dumps({"error": str(error)}, ensure_ascii=False)
+        except Exception as error:
+            status, content_type, body = 500, "application/json", \
+                json.dumps({"error": f"{type(error).__name__}: {error}"}, ensure_ascii=False)
+        data = body.encode("utf8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def __respond(self, reader: asyncio.StreamReader) -> tuple[int, str, str]:
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "La petición no es HTTP.") from None
+        headers = await self.__read_headers(reader)
+        url = urlsplit(target)
+        if url.path == "/health":
+            if method != "GET":
+                raise HttpError(405, "Usa GET /health.")
+            return 200, "application/json", json.dumps({
+                "status": "ok", "pending": self.__pending,
+                "queue": self.__queue, "served": self.__served,
+            })
+        if url.path != "/analyze":
+            raise HttpError(404, f"La ruta {url.path} no existe.")
+        if method != "POST":
+            raise HttpError(405, "Usa POST /analyze.")
+        options = get_options(url.query, self.__cache_dir, self.__tokenizer)
+        if self.__pending >= self.__queue:
+            raise HttpError(503, "El servidor está ocupado, inténtalo más tarde.")
+        self.__pending += 1
+        try:
+            paths = parse_qs(url.query).get("path")
+            if paths:
+                report = await self.__analyze_path(self.__resolve_path(paths[-1]), options)
+            else:
+                report = await self.__analyze_upload(reader, headers, options)
+        finally:
+            self.__pending -= 1
+        self.__served += 1
+        return 200, "application/x-ndjson", report
+
+    async def __read_headers(self, reader: asyncio.StreamReader) -> dict[str, str]:
+        headers = dict[str, str]()
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                return headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise HttpError(400, "La petición tiene demasiadas cabeceras.")
+
+    def __resolve_path(self, path: str) -> str:
+        """
+        Returns the real path of a chat given in `?path=`, relative to
+        the root. The links are resolved before checking that it is
+        inside the root, so no other file of the server can be read.
+
+        Raises:
+            HttpError: If there is no root, the path is outside of it
+            or the file does not exist.
+        """
+        if self.__root is None:
+            raise HttpError(403, "?path= está desactivado, inicia el servidor con --root.")
+        real_path = os.path.realpath(os.path.join(self.__root, path))
+        if os.path.commonpath((self.__root, real_path)) != self.__root:
+            raise HttpError(403, f"El archivo {path} está fuera de la carpeta del servidor.")
+        if not os.path.isfile(real_path):
+            raise HttpError(404, f"El archivo {path} no existe.")
+        return real_path
+
+    async def __analyze_path(self, path: str, options: dict) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, analyze, path, options)
+
+    async def __analyze_upload(
+        self, reader: asyncio.StreamReader, headers: dict[str, str], options: dict
+    ) -> str:
+        try:
+            length = int(headers["content-length"])
+        except KeyError:
+            raise HttpError(411, "Envía el chat con Content-Length o indica ?path=.") from None
+        except ValueError:
+            raise HttpError(400, "Content-Length no es un número.") from None
+        if length <= 0:
+            raise HttpError(400, "Envía el chat en el cuerpo de la petición o indica ?path=.")
+        if length > self.__max_upload:
+            raise HttpError(413, f"El chat supera el máximo de {self.__max_upload} bytes.")
+        # The upload is written to a temporary file as it arrives,
+        # so the analyzers read it like any other chat.
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        suffix = UPLOAD_SUFFIXES.get(content_type, ".txt")
+        with NamedTemporaryFile("wb", suffix=suffix, delete=False) as file:
+            filename = file.name
+            try:
+                while length > 0:
+                    data = await reader.read(min(length, READ_SIZE))
+                    if not data:
+                        raise HttpError(400, "El chat llegó incompleto.")
+                    file.write(data)
+                    length -= len(data)
+            except BaseException:
+                os.remove(filename)
+                raise
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, analyze, filename, options)
+        finally:
+            os.remove(filename)
+
+async def serve(
+    server: AnalysisServer, host: str, port: int, unix: Optional[str]
+) -> None:
+    "Listens on the TCP address, or on the Unix socket, until interrupted."
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, path=unix)
+        address = unix
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        address = f"http://{host}:{port}"
+    print(f"Servidor listo en {address}")
+    async with listener:
+        await listener.serve_forever()
+
+def main(
+    host: str = Option("127.0.0.1", "--host", help="Address of the server."),
+    port: int = Option(8080, "--port", help="Port of the server."),
+    unix: Optional[str] = Option(
+        None, "--unix", help="Listen on this Unix socket instead of TCP."
+    ),
+    jobs: int = Option(
+        os.cpu_count() or 1, "--jobs", "-j", help="Number of workers."
+    ),
+    threads: bool = Option(
+        False, "--threads", help="Analyze the chats in threads instead of processes."
+    ),
+    queue: Optional[int] = Option(
+        None, "--queue", help="Maximum number of requests accepted at once."
+    ),
+    max_upload: int = Option(
+        256, "--max-upload", help="Maximum size of an uploaded chat in MiB."
+    ),
+    cache_dir: Optional[str] = Option(
+        None, "--cache-dir", "-c", help="Directory where the analyses are cached."
+    ),
+    fast_tokenizer: bool = Option(
+        False, "--fast-tokenizer", help="Split words with a regex instead of nltk."
+    ),
+    sentiment: bool = Option(
+        False, "--sentiment", "-s", help="Also load the VADER lexicon at start-up."
+    ),
+    root: Optional[str] = Option(
+        None, "--root", help="Directory of the chats that can be analyzed with ?path=."
+    )
+):
+    tokenizer = "fast" if fast_tokenizer else "nltk"
+    jobs = max(jobs, 1)
+    load_resources(tokenizer, sentiment)
+    if threads:
+        executor = ThreadPoolExecutor(max_workers=jobs)
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=load_resources, initargs=(tokenizer, sentiment)
+        )
+        # Each submission without an idle worker starts a new one,
+        # so the workers load their resources before the first request.
+        for future in [executor.submit(os.getpid) for _ in range(jobs)]:
+            future.result()
+    server = AnalysisServer(
+        executor, queue or 4 * jobs, max_upload * 2 ** 20, cache_dir, tokenizer, root
+    )
+    try:
+        asyncio.run(serve(server, host, port, unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if unix and os.path.exists(unix):
+            os.remove(unix)
+
+if __name__ == "__main__":
+    run(main)
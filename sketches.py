@@ -0,0 +1,174 @@
+"""
+sketches
+
+This module counts the words and emojis of huge chats in bounded
+memory, for the approximate mode of the analysis.
+
+SpaceSaving (Metwally, Agrawal and El Abbadi, 2005) monitors at most
+`capacity` terms. A new term that arrives when the sketch is full
+takes the place of the least counted one and inherits its count as
+an error. The counts are never below the true ones, and they exceed
+them by at most `error_bound`, which is never above N / capacity for
+a stream of N terms: every term counted more often than that is
+monitored, so the top-N rankings of the report are kept as long as
+`capacity` is well above N.
+
+Author: Christopher Villamarín (xeland314)
+
+Dependencies: standard python modules (collections, heapq, itertools, typing).
+"""
+
+from collections.abc import Mapping
+from heapq import heapify, heappop, heappush, nlargest
+from itertools import chain
+from typing import Iterator, Mapping as MappingType, Union
+
+class SpaceSaving(Mapping):
+    """
+    A Space-Saving sketch of term counts. It is a read-only mapping
+    from the monitored terms to their (upper bound) counts, so it can
+    replace a FreqDist in the rankings and the word clouds.
+
+    Parameters:
+        - capacity: int, the maximum number of terms monitored
+
+    Example:
+        ```python
+        sketch = SpaceSaving(1000)
+        sketch.update(Counter(words))
+        sketch.most_common(10)       # [(word, count), ...]
+        sketch.get_error("hola")     # the count of "hola" is exact up to this
+        sketch.error_bound           # the most any count can be off
+        ```
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("The capacity of the sketch must be positive.")
+        self.__capacity = capacity
+        self.__counts = dict[str, int]()
+        self.__errors = dict[str, int]()
+        # A min-heap of (count, term). Increments push a new entry and
+        # leave the old one behind; entries whose count is not the
+        # current count of their term are skipped when popped.
+        self.__heap = list[tuple[int, str]]()
+        self.__total = 0
+
+    @property
+    def capacity(self) -> int:
+        "Returns the maximum number of terms monitored."
+        return self.__capacity
+
+    @property
+    def total(self) -> int:
+        "Returns the number of terms counted, which is exact."
+        return self.__total
+
+    @property
+    def error_bound(self) -> int:
+        """
+        Returns the most by which a count can exceed the true count of
+        its term, which is also the most times an unmonitored term can
+        have appeared. It is 0 while no term was evicted.
+        """
+        if len(self.__counts) < self.__capacity:
+            return 0
+        return self.__get_minimum()[0]
+
+    def add(self, term: str, count: int = 1) -> None:
+        "Counts `count` more occurrences of a term."
+        counts = self.__counts
+        current = counts.get(term)
+        if current is not None:
+            counts[term] = current = current + count
+        elif len(counts) < self.__capacity:
+            counts[term] = current = count
+            self.__errors[term] = 0
+        else:
+            minimum, victim = self.__get_minimum()
+            heappop(self.__heap)
+            del counts[victim]
+            del self.__errors[victim]
+            counts[term] = current = minimum + count
+            self.__errors[term] = minimum
+        self.__total += count
+        heappush(self.__heap, (current, term))
+        if len(self.__heap) > 4 * self.__capacity + 64:
+            self.__rebuild_heap()
+
+    def update(self, counts: Union[MappingType[str, int], "SpaceSaving"]) -> None:
+        """
+        Counts the terms of a mapping of counts (a Counter of a message,
+        for example). Another sketch is merged with `merge` instead.
+        """
+        if isinstance(counts, SpaceSaving):
+            self.merge(counts)
+            return
+        for term, count in counts.items():
+            self.add(term, count)
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """
+        Adds the counts of another sketch. A term missing from one of
+        the sketches may have been counted up to its error bound there,
+        so that bound is added to its count and its error, and the
+        `capacity` terms with the largest counts are kept.
+        """
+        own_bound, other_bound = self.error_bound, other.error_bound
+        own_counts, other_counts = self.__counts, other.__counts
+        terms = chain(own_counts, (term for term in other_counts if term not in own_counts))
+        counts = {
+            term: own_counts.get(term, own_bound) + other_counts.get(term, other_bound)
+            for term in terms
+        }
+        if len(counts) > self.__capacity:
+            # The kept terms stay in their order, which breaks the ties of most_common.
+            kept = {term for term, _ in nlargest(
+                self.__capacity, counts.items(), key=lambda item: item[1]
+            )}
+            counts = {term: count for term, count in counts.items() if term in kept}
+        self.__errors = {
+            term: self.__errors.get(term, own_bound) + other.__errors.get(term, other_bound)
+            for term in counts
+        }
+        self.__counts = counts
+        self.__total += other.total
+        self.__rebuild_heap()
+
+    def get_error(self, term: str) -> int:
+        """
+        Returns the most by which the count of a term can exceed its
+        true count. For an unmonitored term, it is the error bound.
+        """
+        return self.__errors.get(term, self.error_bound)
+
+    def most_common(self, n: int) -> list[tuple[str, int]]:
+        """
+        Returns the n terms with the largest counts, with their counts.
+        Ties keep the order in which the terms were first monitored.
+        """
+        return nlargest(n, self.__counts.items(), key=lambda item: item[1])
+
+    def __get_minimum(self) -> tuple[int, str]:
+        "Returns the entry of the least counted term, dropping stale entries."
+        heap, counts = self.__heap, self.__counts
+        while counts.get(heap[0][1]) != heap[0][0]:
+            heappop(heap)
+        return heap[0]
+
+    def __rebuild_heap(self) -> None:
+        self.__heap = [(count, term) for term, count in self.__counts.items()]
+        heapify(self.__heap)
+
+    def __getitem__(self, term: str) -> int:
+        return self.__counts[term]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__counts)
+
+    def __len__(self) -> int:
+        return len(self.__counts)
+
+    def __repr__(self) -> str:
+        return (f"<SpaceSaving with {len(self.__counts)} of {self.__capacity} terms, "
+                f"{self.__total} counted, error bound {self.error_bound}>")
@@ -15,6 +15,7 @@ Attributes:
     - `IS_INCLUDED_A_SECOND_LANGUAGE` (bool): A flag indicating whether stop words for the second language
     should be included in the stop word set, currently set to True.
     - `STOPWORDS` (set): A set containing the stop words for the selected languages and additional sources.
+    It is loaded on first access (or with `get_stopwords()`), so importing this module is cheap.
 
 Additional Files:
     - `alphabet.txt`: Contains a list of words organized by alphabet. These words are used to avoid removing
@@ -43,26 +44,53 @@ Author: Christopher Villamarín (xeland314)
 Dependencies: downloaded packages (nltk).
 """
 
-from nltk.corpus import stopwords
+import os
 
 FIRST_LANGUAGE = "spanish"
 SECOND_LANGUAGE = "english"
 
 IS_INCLUDED_A_SECOND_LANGUAGE = True
 
-STOPWORDS = stopwords.words(FIRST_LANGUAGE)
+STOPWORDS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords")
 
-if IS_INCLUDED_A_SECOND_LANGUAGE:
-    STOPWORDS += stopwords.words(SECOND_LANGUAGE)
+_STOPWORDS = None
 
-with open("stopwords/alphabet.txt", "r", encoding="utf8") as file:
-    STOPWORDS += [line.replace("\n", "") for line in file]
-    STOPWORDS += [line.replace("\n", "").upper() for line in file]
+def load_stopwords() -> set[str]:
+    """
+    Reads the stop words of the selected languages from nltk
+    and the additional files of the `stopwords` directory.
+    """
+    from nltk.corpus import stopwords
 
-with open("stopwords/punctuation.txt", "r", encoding="utf8") as file:
-    STOPWORDS += [line.replace("\n", "") for line in file]
+    stop_words = stopwords.words(FIRST_LANGUAGE)
 
-with open("stopwords/otherwords.txt", "r", encoding="utf8") as file:
-    STOPWORDS += [line.replace("\n", "") for line in file]
+    if IS_INCLUDED_A_SECOND_LANGUAGE:
+        stop_words += stopwords.words(SECOND_LANGUAGE)
 
-STOPWORDS = set(STOPWORDS)
+    with open(os.path.join(STOPWORDS_DIRECTORY, "alphabet.txt"), "r", encoding="utf8") as file:
+        stop_words += [line.replace("\n", "") for line in file]
+        stop_words += [line.replace("\n", "").upper() for line in file]
+
+    with open(os.path.join(STOPWORDS_DIRECTORY, "punctuation.txt"), "r", encoding="utf8") as file:
+        stop_words += [line.replace("\n", "") for line in file]
+
+    with open(os.path.join(STOPWORDS_DIRECTORY, "otherwords.txt"), "r", encoding="utf8") as file:
+        stop_words += [line.replace("\n", "") for line in file]
+
+    return set(stop_words)
+
+def get_stopwords() -> set[str]:
+    """
+    Returns the set of stop words. The set is loaded
+    the first time it is requested and reused afterwards.
+    """
+    global _STOPWORDS
+    if _STOPWORDS is None:
+        _STOPWORDS = load_stopwords()
+    return _STOPWORDS
+
+def __getattr__(name: str):
+    # STOPWORDS is loaded lazily, on the first access.
+    if name == "STOPWORDS":
+        return get_stopwords()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")